@@ -1,9 +1,90 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from app.models import classifier, sentiment, embedder, summarizer, reply_gen
+from app.models import (
+    classifier, sentiment, embedder, summarizer, reply_gen, knowledge_base, trends, conversation
+)
+from app.utils import concurrency, inference_pool, jobs, near_duplicates, serialization, traffic_capture
+from app.utils.scheduling import API_KEY_HEADER, PRIORITY_HEADER, resolve_priority
+from app.utils.request_context import (
+    DEADLINE_HEADER, DeadlineExceeded, RequestCancelled, RequestContext, watch_disconnect
+)
 
-router = APIRouter()
+router = APIRouter(default_response_class=serialization.FastJSONResponse)
+
+async def request_context(
+    request: Request,
+    timeout_ms: Optional[str] = Header(default=None, alias=DEADLINE_HEADER),
+    priority: Optional[str] = Header(default=None, alias=PRIORITY_HEADER),
+    api_key: Optional[str] = Header(default=None, alias=API_KEY_HEADER)
+):
+    """
+    Per-request deadline, priority class and cancellation state.
+    
+    The caller's remaining budget comes from the X-Request-Timeout-Ms header.
+    The priority class (interactive/standard/bulk) comes from X-Priority or
+    from the class mapped to the caller's X-API-Key.
+    A background task cancels the context if the client disconnects, so queued
+    work is dropped and generation loops stop early.
+    """
+    ctx = RequestContext.from_header(timeout_ms, resolve_priority(priority, api_key))
+    watcher = asyncio.create_task(watch_disconnect(request, ctx))
+    try:
+        yield ctx
+    finally:
+        watcher.cancel()
+
+def _shed_error(e: RequestCancelled) -> HTTPException:
+    """Map shed or cancelled work to a status code"""
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=str(e))
+    return HTTPException(status_code=499, detail=str(e))  # Client closed request
+
+def _degrade(endpoint: str, request: BaseModel) -> dict:
+    """
+    Cheap answer for a request shed by the endpoint's concurrency limiter.
+    
+    The fallback per endpoint comes from DEGRADE_MODES: cached
+    classifications, extractive or skipped summaries, template replies.
+    Anything without a usable fallback gets 503 with Retry-After.
+    """
+    mode = concurrency.degrade_mode(endpoint)
+    degraded = {"degraded": True, "degraded_mode": mode}
+    if endpoint == "classify" and mode == "cache":
+        cached = classifier.cached_classification(request.text, request.labels)
+        if cached is not None:
+            return {**cached, **degraded}
+    elif endpoint == "summarize" and mode == "extractive":
+        return {**summarizer.summarize_text(request.text, request.max_length, mode="extractive"), **degraded}
+    elif endpoint == "summarize" and mode == "skip":
+        return {"summary": None, "mode": "skipped", "input_length": len(request.text), **degraded}
+    elif endpoint == "reply" and mode == "template":
+        return {**reply_gen.generate_template_reply(request.text, request.tone), **degraded}
+    raise HTTPException(
+        status_code=503,
+        detail=f"/{endpoint} is overloaded, retry later",
+        headers={"Retry-After": "1"}
+    )
+
+# Result fields safe to hand to a near-duplicate request: labels and scores
+# only, never anything copied from (or pointing into) the representative's text
+CLASSIFY_SHARED_FIELDS = ("top_label", "top_score", "full_output")
+SENTIMENT_SHARED_FIELDS = ("label", "score")
+
+async def _reuse_near_duplicate(text: str, key: tuple, compute, fields: tuple, ctx: RequestContext) -> dict:
+    """
+    Run `compute` once per near-duplicate cluster and analysis key.
+    
+    Texts that match a recent cluster get the representative's result (or
+    wait for the one in flight, within ctx's deadline) when it consists only
+    of `fields`; the match is reported as near_duplicate.
+    """
+    match = near_duplicates.match(text)
+    if match is None:
+        return {**await compute(), "near_duplicate": None}
+    result, reused = await match.run(key, compute, fields, ctx)
+    return {**result, "near_duplicate": match.describe(reused) if match.duplicate else None}
 
 class ClassifyRequest(BaseModel):
     text: str
@@ -11,51 +92,210 @@ class ClassifyRequest(BaseModel):
 
 class SentimentRequest(BaseModel):
     text: str
+    mode: Optional[str] = Field(default="auto", pattern="^(auto|single|long)$")
 
 class EmbedRequest(BaseModel):
     text: str
+    encoding: Optional[str] = Field(default="float", pattern="^(float|base64)$")
+    dtype: Optional[str] = Field(default="float32", pattern="^(float32|float16)$")
+    # Complaint embeddings feed /trends; pass false for queries and KB text
+    track: Optional[bool] = True
 
 class SummarizeRequest(BaseModel):
     text: str
     max_length: Optional[int] = Field(default=120, ge=30, le=500)
     min_length: Optional[int] = Field(default=30, ge=10, le=200)
+    mode: Optional[str] = Field(default="abstractive", pattern="^(abstractive|extractive|auto)$")
+    latency_budget_ms: Optional[int] = Field(default=None, ge=50, le=120000)
+    quality: Optional[str] = Field(default=None, pattern="^(fast|balanced|best)$")
 
 class ReplyRequest(BaseModel):
     text: str
     kb_context: Optional[List[str]] = None
     tone: Optional[str] = Field(default="polite", pattern="^(polite|friendly|professional|empathetic)$")
+    latency_budget_ms: Optional[int] = Field(default=None, ge=50, le=120000)
+    quality: Optional[str] = Field(default=None, pattern="^(fast|balanced|best)$")
+
+class SummarizeJobRequest(SummarizeRequest):
+    callback_url: Optional[str] = Field(default=None, pattern="^https?://")
+
+class ReplyJobRequest(ReplyRequest):
+    callback_url: Optional[str] = Field(default=None, pattern="^https?://")
+
+class ConversationMessage(BaseModel):
+    text: str = Field(min_length=1)
+    role: Optional[str] = Field(default="customer", pattern="^(customer|agent)$")
+
+class KBArticle(BaseModel):
+    id: str
+    title: Optional[str] = ""
+    text: str = Field(min_length=1)
+
+class KBArticleBody(BaseModel):
+    title: Optional[str] = ""
+    text: str = Field(min_length=1)
+
+class KBUpsertRequest(BaseModel):
+    articles: List[KBArticle]
+
+class KBSearchRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = Field(default=3, ge=1, le=50)
+
+def _summarize_mode(request: SummarizeRequest) -> str:
+    """Concrete mode for a summarize request (resolves mode=auto)"""
+    if request.mode == "auto" and len(request.text.strip()) >= 50:
+        return summarizer.choose_mode(request.text, request.latency_budget_ms)
+    return request.mode
+
+async def _run_summarize(request: SummarizeRequest, ctx: RequestContext, mode: Optional[str] = None) -> dict:
+    """Summarization shared by /summarize and summarize jobs"""
+    mode = mode or _summarize_mode(request)
+    # Extractive work gets its own pool so it never queues behind BART
+    return await inference_pool.run(
+        "extractive" if mode == "extractive" else "summarizer", ctx, summarizer.summarize_text,
+        text=request.text,
+        max_length=request.max_length,
+        min_length=request.min_length,
+        mode=mode,
+        latency_budget_ms=request.latency_budget_ms,
+        quality=request.quality
+    )
+
+async def _run_reply(request: ReplyRequest, ctx: RequestContext) -> dict:
+    """Reply generation (with KB retrieval) shared by /reply and reply jobs"""
+    kb_context = request.kb_context
+    kb_articles = None
+    if kb_context is None and not knowledge_base.known_empty():
+        kb_articles = await inference_pool.run(
+            "embedder", ctx, knowledge_base.retrieve_snippets, request.text, 3
+        ) or None
+        if kb_articles:
+            kb_context = [article["text"] for article in kb_articles]
+    
+    result = await inference_pool.run(
+        "reply_gen", ctx, reply_gen.generate_reply,
+        ticket_text=request.text,
+        kb_context=kb_context,
+        tone=request.tone,
+        latency_budget_ms=request.latency_budget_ms,
+        quality=request.quality
+    )
+    if kb_articles is not None:
+        result["kb_articles"] = [
+            {"id": a["id"], "title": a["title"], "score": a["score"]} for a in kb_articles
+        ]
+    return result
+
+jobs.register_runner("summarize", lambda payload, ctx: _run_summarize(SummarizeRequest(**payload), ctx))
+jobs.register_runner("reply", lambda payload, ctx: _run_reply(ReplyRequest(**payload), ctx))
 
 @router.post("/classify")
-async def classify_text(request: ClassifyRequest):
+async def classify_text(request: ClassifyRequest, ctx: RequestContext = Depends(request_context)):
+    async def compute():
+        with concurrency.admit("classify") as admitted:
+            if not admitted:
+                return _degrade("classify", request)
+            result = await inference_pool.run(
+                "classifier", ctx, classifier.classify_text, request.text, request.labels
+            )
+            return {**result, "degraded": False}
+
     try:
-        result = classifier.classify_text(request.text, request.labels)
-        return result
+        key = ("classify", tuple(request.labels or classifier.DEFAULT_LABELS))
+        return await _reuse_near_duplicate(request.text, key, compute, CLASSIFY_SHARED_FIELDS, ctx)
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/sentiment")
-async def analyze_sentiment(request: SentimentRequest):
+async def analyze_sentiment(request: SentimentRequest, ctx: RequestContext = Depends(request_context)):
+    """
+    Analyze sentiment of a message or complaint.
+    
+    Modes:
+    - single: one pass over the text (truncated at 512 tokens)
+    - long: sentence windows scored in one batch, with aggregate and trajectory
+    - auto (default): long mode only for texts over the 512-token limit
+    """
+    async def compute():
+        with concurrency.admit("sentiment") as admitted:
+            if not admitted:
+                return _degrade("sentiment", request)
+            result = await inference_pool.run(
+                "sentiment", ctx, sentiment.analyze_sentiment, request.text, request.mode
+            )
+            return {**result, "degraded": False}
+
     try:
-        result = sentiment.analyze_sentiment(request.text)
-        return result
+        # Long-mode results carry segment offsets into their own text, so
+        # only single-pass label/score results are shared
+        return await _reuse_near_duplicate(
+            request.text, ("sentiment", request.mode), compute, SENTIMENT_SHARED_FIELDS, ctx
+        )
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/embed")
-async def get_embedding(request: EmbedRequest):
+async def get_embedding(
+    request: EmbedRequest,
+    accept: Optional[str] = Header(default=None),
+    ctx: RequestContext = Depends(request_context)
+):
+    """
+    Embed text with content negotiation on the Accept header.
+    
+    Formats:
+    - application/json (default): list of floats, or base64 with encoding="base64"
+    - application/x-float32 / application/octet-stream: raw little-endian bytes
+    - application/x-float16: raw little-endian half-precision bytes
+    - application/msgpack: MessagePack map with the vector as a bin field
+    
+    Binary responses carry X-Embedding-Dtype and X-Embedding-Dimensions headers.
+    Unless track is false, the embedding is also assigned to a topic cluster
+    for /trends.
+    """
     try:
-        embedding = embedder.get_embedding(request.text)
-        return {
-            "embedding": embedding,
-            "dimensions": len(embedding)
-        }
+        with concurrency.admit("embed") as admitted:
+            if not admitted:
+                return _degrade("embed", request)
+            embedding = await inference_pool.run(
+                "embedder", ctx, embedder.get_embedding_array, request.text
+            )
+            if request.track:
+                trends.get_engine().observe(embedding, request.text)
+            return serialization.vector_response(
+                embedding,
+                media_type=serialization.negotiate_media_type(accept),
+                encoding=request.encoding,
+                dtype=request.dtype
+            )
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/summarize")
-async def summarize_text(request: SummarizeRequest):
+async def summarize_text(request: SummarizeRequest, ctx: RequestContext = Depends(request_context)):
     """
-    Generate an abstractive summary of the input text.
+    Generate a summary of the input text.
+    
+    Modes:
+    - abstractive (default): BART beam search, seconds per call on CPU
+    - extractive: TextRank sentence selection, tens of milliseconds
+    - auto: extractive for inputs up to ~500 words or when BART is backed up
+    
+    Pass latency_budget_ms (or quality: fast/balanced/best) to bound generation
+    time; the response reports the decoding strategy chosen and elapsed_ms.
     
     Use cases:
     - Summarize long complaint descriptions
@@ -64,28 +304,40 @@ async def summarize_text(request: SummarizeRequest):
     
     Note: Requires at least 50 characters of input text.
     """
+    # Never reused across near duplicates: a summary quotes its own input
+    # (names, account numbers) and carries per-request timing and lengths
     try:
-        result = summarizer.summarize_text(
-            text=request.text,
-            max_length=request.max_length,
-            min_length=request.min_length
-        )
-        return result
+        # Extractive and abstractive latencies differ ~100x: limit them separately
+        mode = _summarize_mode(request)
+        limiter = "summarize:extractive" if mode == "extractive" else "summarize:abstractive"
+        with concurrency.admit(limiter) as admitted:
+            if not admitted:
+                return _degrade("summarize", request)
+            result = await _run_summarize(request, ctx, mode)
+            return {**result, "degraded": False}
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
 
 @router.post("/reply")
-async def generate_reply(request: ReplyRequest):
+async def generate_reply(request: ReplyRequest, ctx: RequestContext = Depends(request_context)):
     """
     Generate a draft reply for a support ticket using RAG approach.
     
     Features:
     - Supports multiple tones (polite, friendly, professional, empathetic)
     - Uses KB context for more accurate responses (RAG)
+    - Retrieves the top 3 articles from the built-in KB index when kb_context
+      is omitted (pass an empty list to generate without context)
     - Returns confidence score and human review flag
     - Tracks which model/API was used
+    - latency_budget_ms / quality pick the local decoding strategy (sampling,
+      beam or greedy, max new tokens); response reports decoding and elapsed_ms
     
     IMPORTANT: Always review generated replies before sending to customers.
     Set up approval workflows for replies with needs_human_review=True.
@@ -96,13 +348,223 @@ async def generate_reply(request: ReplyRequest):
     - Falls back to local model if no API keys set
     """
     try:
-        result = reply_gen.generate_reply(
-            ticket_text=request.text,
-            kb_context=request.kb_context,
-            tone=request.tone
-        )
-        return result
+        with concurrency.admit("reply") as admitted:
+            if not admitted:
+                return _degrade("reply", request)
+            result = await _run_reply(request, ctx)
+            return {**result, "degraded": False}
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reply generation failed: {str(e)}")
+
+async def _submit_job(kind: str, request: BaseModel, ctx: RequestContext) -> serialization.FastJSONResponse:
+    try:
+        if request.callback_url:
+            await asyncio.to_thread(jobs.check_callback_url, request.callback_url)
+        job, handle_id, deduplicated = jobs.get_store().submit(
+            kind,
+            request.model_dump(exclude={"callback_url"}),
+            priority=ctx.priority,
+            callback_url=request.callback_url
+        )
+    except jobs.InvalidCallback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except jobs.JobRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return serialization.FastJSONResponse(status_code=202, content={
+        "job_id": handle_id,
+        "status": job["status"],
+        "deduplicated": deduplicated,
+        "status_url": f"/jobs/{handle_id}"
+    })
+
+@router.post("/jobs/summarize", status_code=202)
+async def submit_summarize_job(request: SummarizeJobRequest, ctx: RequestContext = Depends(request_context)):
+    """
+    Queue a summarization and return a job id at once.
+    
+    Takes the /summarize body plus an optional callback_url that receives the
+    finished job as a JSON POST. An identical pending job is reused
+    (deduplicated: true) instead of queueing the work twice.
+    """
+    return await _submit_job("summarize", request, ctx)
+
+@router.post("/jobs/reply", status_code=202)
+async def submit_reply_job(request: ReplyJobRequest, ctx: RequestContext = Depends(request_context)):
+    """Queue a reply generation; same contract as /jobs/summarize"""
+    return await _submit_job("reply", request, ctx)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status: queued, running, succeeded, failed or cancelled, with result or error"""
+    job = jobs.get_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found (or expired)")
+    return jobs.public_view(job, job_id)
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel your handle on a queued or running job; finished jobs are
+    returned unchanged. Work shared with deduplicated submitters keeps
+    running until every one of them has cancelled.
+    """
+    job = jobs.get_store().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found (or expired)")
+    return jobs.public_view(job, job_id)
+
+@router.post("/kb/articles")
+async def upsert_kb_articles(request: KBUpsertRequest, ctx: RequestContext = Depends(request_context)):
+    """Add or replace knowledge base articles in bulk (embedded in one batch)"""
+    try:
+        ids, total = await inference_pool.run(
+            "embedder", ctx, knowledge_base.upsert_articles,
+            [article.model_dump() for article in request.articles]
+        )
+        return {"upserted": ids, "total_articles": total}
+    except RequestCancelled as e:
+        raise _shed_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"KB update failed: {str(e)}")
+
+@router.put("/kb/articles/{article_id}")
+async def put_kb_article(article_id: str, request: KBArticleBody, ctx: RequestContext = Depends(request_context)):
+    """Add or update a single knowledge base article"""
+    try:
+        _, total = await inference_pool.run(
+            "embedder", ctx, knowledge_base.upsert_articles,
+            [{"id": article_id, "title": request.title, "text": request.text}]
+        )
+        return {"id": article_id, "total_articles": total}
+    except RequestCancelled as e:
+        raise _shed_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"KB update failed: {str(e)}")
+
+@router.delete("/kb/articles/{article_id}")
+async def delete_kb_article(article_id: str):
+    """Remove a knowledge base article"""
+    # Off the loop: the first call may load the index from disk
+    total = await asyncio.to_thread(knowledge_base.delete_article, article_id)
+    if total is None:
+        raise HTTPException(status_code=404, detail=f"Article {article_id} not found")
+    return {"deleted": article_id, "total_articles": total}
+
+@router.post("/kb/search")
+async def search_kb(request: KBSearchRequest, ctx: RequestContext = Depends(request_context)):
+    """Hybrid BM25 + embedding search over the knowledge base"""
+    try:
+        results, total = await inference_pool.run(
+            "embedder", ctx, knowledge_base.search, request.query, request.top_k
+        )
+        return {"results": results, "total_articles": total}
+    except RequestCancelled as e:
+        raise _shed_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"KB search failed: {str(e)}")
+
+@router.get("/kb")
+async def kb_info():
+    """Knowledge base index size and configuration"""
+    return await asyncio.to_thread(knowledge_base.info)
+
+@router.post("/conversations/{conversation_id}/messages")
+async def add_conversation_message(
+    conversation_id: str, request: ConversationMessage, ctx: RequestContext = Depends(request_context)
+):
+    """
+    Add one chat message to a conversation and return the updated state.
+    
+    Only the new message is scored: customer messages get sentiment and
+    update the running sentiment, trend and escalation risk; every message
+    moves the rolling topic. Cost per message is constant however long the
+    conversation gets. Conversations expire after CONVERSATION_TTL_SECONDS
+    without messages.
+    """
+    try:
+        with concurrency.admit("conversation") as admitted:
+            if not admitted:
+                return _degrade("conversation", request)
+            embedding = inference_pool.run("embedder", ctx, conversation.embed_message, request.text)
+            if request.role == "customer":
+                sentiment_result, vector = await asyncio.gather(
+                    inference_pool.run("sentiment", ctx, sentiment.analyze_sentiment, request.text, "single"),
+                    embedding
+                )
+            else:
+                sentiment_result, vector = None, await embedding
+            return conversation.get_store().update(conversation_id, request.text, sentiment_result, vector)
+    except HTTPException:
+        raise
+    except RequestCancelled as e:
+        raise _shed_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str):
+    """Current state of a conversation (404 once it has expired)"""
+    state = conversation.get_store().get(conversation_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found (or expired)")
+    return state
+
+@router.delete("/conversations/{conversation_id}")
+async def end_conversation(conversation_id: str):
+    """End a conversation and return its final state"""
+    state = conversation.get_store().end(conversation_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found (or expired)")
+    return state
+
+@router.get("/trends")
+async def get_trends(
+    recent_buckets: int = Query(default=4, ge=1, le=48),
+    min_count: int = Query(default=5, ge=1),
+    min_growth: float = Query(default=2.0, ge=1.0),
+    limit: int = Query(default=10, ge=1, le=100)
+):
+    """
+    Complaint topics whose volume is rising.
+    
+    Compares each topic cluster's count over the last `recent_buckets` time
+    buckets (15 minutes each by default) with its own earlier rate, and
+    returns clusters with at least `min_count` recent complaints and
+    `min_growth` times the expected volume, with top terms and sample texts.
+    """
+    return trends.get_engine().trends(
+        recent_buckets=recent_buckets, min_count=min_count, min_growth=min_growth, limit=limit
+    )
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Inference queue and load-shedding counters per model executor.
+    
+    - rejected_on_arrival: deadline already passed or predicted queue wait too long
+    - dropped_expired / dropped_cancelled: removed from the queue before running
+    - aborted_in_flight: generation stopped mid-run by deadline or disconnect
+    - priority_classes: per-class weight, queue depth and p50/p95 queue time
+    - concurrency: adaptive limit, in-flight count and shed count per endpoint
+    - jobs: job counts by status and pending-queue capacity
+    - near_duplicates: live clusters and how many requests reused a cluster result
+    - trends: topic clusters in use and complaints observed
+    - conversations: live chat sessions and messages processed
+    - traffic_capture: records captured, dropped (writer behind) and skipped
+      (oversized or not JSON); null when capture is off
+    """
+    return {
+        "executors": inference_pool.stats(),
+        "concurrency": concurrency.stats(),
+        "jobs": jobs.get_store().stats(),
+        "near_duplicates": near_duplicates.get_index().snapshot(),
+        "trends": trends.get_engine().snapshot(),
+        "conversations": conversation.get_store().snapshot(),
+        "traffic_capture": traffic_capture.stats()
+    }
@@ -1,20 +1,81 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
-from app.api.routes import router
 
-# Load environment variables
+# Load environment variables before any app module reads its settings at import
 load_dotenv()
 
+from app.utils import jobs, model_cache, traffic_capture  # noqa: E402
+
+# Go offline before anything imports transformers when snapshots are present
+model_cache.configure_offline()
+
+_import_start = time.monotonic()
+from app.api.routes import router  # noqa: E402  (heavy libraries load lazily)
+model_cache.record("routes_import_seconds", time.monotonic() - _import_start)
+from app.models import knowledge_base  # noqa: E402
+
+# Models to load in the background at startup: "all", a comma list, or empty
+# to load each model on its first request
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "")
+_ready = threading.Event()
+
+
+def _preload():
+    names = "all" if PRELOAD_MODELS == "all" else [n.strip() for n in PRELOAD_MODELS.split(",") if n.strip()]
+    model_cache.preload(names)
+    model_cache.record("ready_seconds", model_cache.process_uptime())
+    _ready.set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model_cache.record("startup_seconds", model_cache.process_uptime())
+    if PRELOAD_MODELS:
+        threading.Thread(target=_preload, name="model-preload", daemon=True).start()
+    else:
+        model_cache.record("ready_seconds", model_cache.process_uptime())
+        _ready.set()
+    # Jobs left unfinished by a previous process (SQLite store only)
+    jobs.get_store().resume()
+    yield
+    # Pending knowledge base edits are saved on a debounce timer
+    await asyncio.to_thread(knowledge_base.flush)
+    # Finish the capture log so its last gzip member is not truncated
+    await asyncio.to_thread(traffic_capture.close)
+
+
 # Create FastAPI app
-app = FastAPI(title="QuickFix AI Service", version="1.0.0")
+app = FastAPI(title="QuickFix AI Service", version="1.0.0", lifespan=lifespan)
 
 # Register routes
 app.include_router(router)
 
+# Opt-in request capture for replay load tests
+if traffic_capture.CAPTURE_PATH:
+    app.add_middleware(traffic_capture.TrafficCapture)
+
 @app.get("/")
 async def root():
     return {"service": "ai-service", "status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until PRELOAD_MODELS have finished loading"""
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready"}
+
+@app.get("/startup")
+async def startup_report():
+    """Import, readiness and per-model load timings since process start"""
+    return model_cache.report()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
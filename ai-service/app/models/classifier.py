@@ -1,13 +1,22 @@
-from transformers import pipeline
+from collections import OrderedDict
 from typing import List, Dict, Optional
+import os
+import threading
+from app.utils.model_cache import lazy_model, load_pipeline
+from app.utils.text_processing import preprocess_text
 
-# Initialize zero-shot classifier
+# Zero-shot classifier (facebook/bart-large-mnli), loaded on first use
 # Note: To use HF Inference API instead, change to:
 # classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli", api_key=os.getenv("HF_API_KEY"))
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+classifier = lazy_model("classifier", lambda: load_pipeline("classifier"))
 
 DEFAULT_LABELS = ["billing", "login", "bug", "feature request", "account"]
 
+# Recent results, served when /classify sheds load under overload
+CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "2048"))
+_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
 def classify_text(text: str, labels: Optional[List[str]] = None) -> Dict:
     """
     Classify text using zero-shot classification.
@@ -22,9 +31,9 @@ def classify_text(text: str, labels: Optional[List[str]] = None) -> Dict:
     if not labels:
         labels = DEFAULT_LABELS
         
-    result = classifier(text, labels, multi_label=False)
+    result = classifier.get()(text, labels, multi_label=False)
     
-    return {
+    output = {
         "top_label": result["labels"][0],
         "top_score": float(result["scores"][0]),
         "full_output": {
@@ -32,3 +41,30 @@ def classify_text(text: str, labels: Optional[List[str]] = None) -> Dict:
             "scores": [float(s) for s in result["scores"]]
         }
     }
+    _remember(text, labels, output)
+    return output
+
+def cached_classification(text: str, labels: Optional[List[str]] = None) -> Optional[Dict]:
+    """
+    Look up a recent classification of the same (normalized) text and labels.
+    
+    Returns:
+        The cached result, or None if this text was not classified recently
+    """
+    key = _cache_key(text, labels or DEFAULT_LABELS)
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+        return result
+
+def _cache_key(text: str, labels: List[str]) -> tuple:
+    return preprocess_text(text), tuple(labels)
+
+def _remember(text: str, labels: List[str], result: Dict) -> None:
+    key = _cache_key(text, labels)
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
@@ -0,0 +1,257 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.models import embedder
+from app.utils.text_processing import extract_features, tokenize_text
+
+# Live chat analytics: each new message updates a per-conversation state in
+# constant time instead of re-scoring the whole transcript. Sessions expire
+# CONVERSATION_TTL_SECONDS after their last message; the least recently
+# active are evicted beyond CONVERSATION_MAX_SESSIONS.
+TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+
+# Running sentiment is a fast and a slow EWMA of per-message valence
+# (2 * P(POSITIVE) - 1); their difference is the trend.
+FAST_ALPHA = 0.5
+SLOW_ALPHA = 0.15
+TREND_EPSILON = 0.15
+# Topic is the nearest prototype to a decayed sum of message embeddings
+TOPIC_DECAY = 0.7
+TOPIC_MIN_SIMILARITY = 0.2
+TOPIC_PROTOTYPES = {
+    "billing": "billing problem, charged twice, invoice, payment, refund, subscription price",
+    "login": "cannot log in, forgot password, password reset, account locked, verification code",
+    "bug": "app crashes, error message, feature not working, page broken, something is wrong",
+    "feature request": "suggestion, please add a new feature, it would be great if the app could",
+    "account": "update account details, change email address, delete my account, profile settings",
+    "delivery": "order not delivered, package late, shipping, tracking number, courier",
+}
+
+# Escalation risk: logistic score over running negativity, the streak of
+# negative customer messages, decayed escalation-term hits and intensity
+ESCALATION_TERMS = {
+    "manager", "supervisor", "lawyer", "legal", "cancel", "chargeback", "unacceptable",
+    "ridiculous", "worst", "escalate", "complaint", "sue", "scam", "terrible",
+}
+ESCALATION_DECAY = 0.7
+RISK_WEIGHTS = {"bias": -3.0, "negativity": 3.0, "streak": 1.5, "terms": 1.2, "intensity": 1.0}
+MAX_STREAK = 4
+
+_prototypes: Optional[np.ndarray] = None
+_prototype_lock = threading.Lock()
+
+
+def _prototype_matrix() -> np.ndarray:
+    """Unit-normalized prototype embeddings, embedded once in one batch"""
+    global _prototypes
+    if _prototypes is None:
+        with _prototype_lock:
+            if _prototypes is None:
+                _prototypes = embedder.get_embeddings(list(TOPIC_PROTOTYPES.values()))
+    return _prototypes
+
+
+def embed_message(text: str) -> np.ndarray:
+    """Unit-normalized message embedding (also warms the topic prototypes)"""
+    _prototype_matrix()
+    return embedder.get_embeddings([text])[0]
+
+
+def valence(sentiment_result: Dict) -> float:
+    """Map a sentiment label/score to [-1, 1]"""
+    p_positive = sentiment_result["score"] if sentiment_result["label"] == "POSITIVE" \
+        else 1.0 - sentiment_result["score"]
+    return 2.0 * p_positive - 1.0
+
+
+class ConversationState:
+    """Running aggregates for one conversation"""
+
+    def __init__(self, conversation_id: str, now: float):
+        self.id = conversation_id
+        self.created = now
+        self.updated = now
+        self.messages = 0
+        self.customer_messages = 0
+        self.last_sentiment: Optional[float] = None
+        self.fast: Optional[float] = None
+        self.slow: Optional[float] = None
+        self.min_sentiment: Optional[float] = None
+        self.negative_streak = 0
+        self.term_score = 0.0
+        self.risk = 0.0
+        self.peak_risk = 0.0
+        self.topic_vector: Optional[np.ndarray] = None
+        self.topic = None
+        self.topic_similarity = 0.0
+
+    def add_sentiment(self, value: float, text: str) -> None:
+        self.customer_messages += 1
+        self.last_sentiment = value
+        if self.fast is None:
+            self.fast = self.slow = self.min_sentiment = value
+        else:
+            self.fast += FAST_ALPHA * (value - self.fast)
+            self.slow += SLOW_ALPHA * (value - self.slow)
+            self.min_sentiment = min(self.min_sentiment, value)
+        self.negative_streak = self.negative_streak + 1 if value < 0 else 0
+
+        tokens = tokenize_text(text)
+        hits = sum(1 for token in tokens if token in ESCALATION_TERMS)
+        self.term_score = ESCALATION_DECAY * self.term_score + hits
+        features = extract_features(text)
+        intensity = min(1.0, features["exclamation_count"] / 3 + max(0.0, features["capital_ratio"] - 0.3))
+
+        score = (
+            RISK_WEIGHTS["bias"]
+            + RISK_WEIGHTS["negativity"] * max(0.0, -self.fast)
+            + RISK_WEIGHTS["streak"] * min(self.negative_streak, MAX_STREAK) / MAX_STREAK
+            + RISK_WEIGHTS["terms"] * min(self.term_score, 2.0)
+            + RISK_WEIGHTS["intensity"] * intensity
+        )
+        self.risk = 1.0 / (1.0 + math.exp(-score))
+        self.peak_risk = max(self.peak_risk, self.risk)
+
+    def add_embedding(self, vector: np.ndarray) -> None:
+        if self.topic_vector is None:
+            self.topic_vector = vector.copy()
+        else:
+            self.topic_vector = TOPIC_DECAY * self.topic_vector + vector
+        direction = self.topic_vector / np.linalg.norm(self.topic_vector)
+        similarities = _prototype_matrix() @ direction
+        best = int(np.argmax(similarities))
+        self.topic_similarity = float(similarities[best])
+        self.topic = list(TOPIC_PROTOTYPES)[best] if self.topic_similarity >= TOPIC_MIN_SIMILARITY else "other"
+
+    def view(self) -> Dict:
+        if self.fast is None:
+            trend = None
+        elif self.fast - self.slow > TREND_EPSILON:
+            trend = "improving"
+        elif self.slow - self.fast > TREND_EPSILON:
+            trend = "worsening"
+        else:
+            trend = "stable"
+        return {
+            "conversation_id": self.id,
+            "messages": self.messages,
+            "customer_messages": self.customer_messages,
+            "sentiment": {
+                "last": _round(self.last_sentiment),
+                "running": _round(self.fast),
+                "baseline": _round(self.slow),
+                "min": _round(self.min_sentiment),
+                "trend": trend,
+                "negative_streak": self.negative_streak,
+            },
+            "escalation": {
+                "risk": round(self.risk, 3),
+                "level": "high" if self.risk >= 0.7 else "medium" if self.risk >= 0.4 else "low",
+                "peak_risk": round(self.peak_risk, 3),
+            },
+            "topic": {"label": self.topic, "similarity": round(self.topic_similarity, 3)},
+            "started_at": self.created,
+            "updated_at": self.updated,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+class ConversationStore:
+    """
+    Bounded in-memory session store, least recently updated first.
+
+    Expiry and eviction pop from the front of an OrderedDict, so each
+    update costs O(1) amortized regardless of how many sessions are live.
+    """
+
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_sessions: int = MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"messages": 0, "expired": 0, "evicted": 0}
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            state = next(iter(self._sessions.values()))
+            if now - state.updated < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.stats["expired"] += 1
+
+    def update(
+        self,
+        conversation_id: str,
+        text: str,
+        sentiment_result: Optional[Dict],
+        vector: np.ndarray,
+        now: Optional[float] = None
+    ) -> Dict:
+        """
+        Fold one message into its conversation and return the new state.
+
+        Args:
+            sentiment_result: Sentiment of the message (None for agent
+                messages, which only move the topic)
+            vector: Unit-normalized message embedding
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            state = self._sessions.pop(conversation_id, None)
+            if state is None:
+                state = ConversationState(conversation_id, now)
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.stats["evicted"] += 1
+            self._sessions[conversation_id] = state
+            state.messages += 1
+            state.updated = now
+            if sentiment_result is not None:
+                state.add_sentiment(valence(sentiment_result), text)
+            state.add_embedding(vector)
+            self.stats["messages"] += 1
+            return state.view()
+
+    def get(self, conversation_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._expire(time.time())
+            state = self._sessions.get(conversation_id)
+            return state.view() if state is not None else None
+
+    def end(self, conversation_id: str) -> Optional[Dict]:
+        """Drop a conversation, returning its final state"""
+        with self._lock:
+            state = self._sessions.pop(conversation_id, None)
+            return state.view() if state is not None else None
+
+    def snapshot(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            **self.stats,
+        }
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ConversationStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore()
+    return _store
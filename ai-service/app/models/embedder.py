@@ -1,8 +1,38 @@
-from sentence_transformers import SentenceTransformer
 from typing import List
+import numpy as np
+from app.utils.model_cache import lazy_model, load_sentence_transformer
 
-# Initialize sentence transformer
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+# Sentence transformer (all-MiniLM-L6-v2), loaded on first use
+model = lazy_model("embedder", lambda: load_sentence_transformer("embedder"))
+
+def get_embedding_array(text: str) -> np.ndarray:
+    """
+    Get embedding vector for input text as a float32 NumPy array.
+    
+    Prefer this over `get_embedding` on hot paths: the array can be packed
+    into binary responses or serialized directly without a Python list copy.
+    
+    Args:
+        text: Input text to embed
+    
+    Returns:
+        1-D float32 array representing the text embedding
+    """
+    embedding = model.get().encode(text, convert_to_tensor=False)
+    return np.asarray(embedding, dtype=np.float32)
+
+def get_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Embed several texts in one batched forward pass.
+    
+    Args:
+        texts: Input texts to embed
+    
+    Returns:
+        2-D float32 array of unit-normalized embeddings, one row per text
+    """
+    embeddings = model.get().encode(texts, convert_to_tensor=False, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
 
 def get_embedding(text: str) -> List[float]:
     """
@@ -15,5 +45,4 @@ def get_embedding(text: str) -> List[float]:
         List of floats representing the text embedding
     """
     # Convert to regular Python list for JSON serialization
-    embedding = model.encode(text, convert_to_tensor=False)
-    return embedding.tolist()
+    return get_embedding_array(text).tolist()
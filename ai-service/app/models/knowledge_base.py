@@ -0,0 +1,330 @@
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models import embedder
+from app.utils.text_processing import tokenize_text
+
+logger = logging.getLogger(__name__)
+
+# On-disk location of the KB index: articles.json holds article text and
+# per-article term frequencies, embeddings.npy the unit-normalized MiniLM
+# vectors (memory-mapped on load, so a large KB costs no load-time copy).
+KB_INDEX_DIR = os.getenv("KB_INDEX_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "kb_index"
+)
+# Changes are written to disk in one batch this many seconds after the first
+# unsaved change, on a background thread
+SAVE_DELAY_SECONDS = float(os.getenv("KB_SAVE_DELAY_SECONDS") or "2.0")
+
+# Hybrid ranking: weight of embedding similarity vs. normalized BM25 score
+HYBRID_ALPHA = float(os.getenv("KB_HYBRID_ALPHA", "0.5"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+EMBEDDING_DIM = 384
+
+
+class KnowledgeBaseIndex:
+    """
+    Hybrid BM25 + embedding index over knowledge-base articles.
+
+    Articles are added, updated and deleted incrementally. Each article owns a
+    row in the embedding matrix; updates and deletes free the old row, and
+    the in-memory matrix is compacted once freed rows outnumber live ones.
+    Changes are persisted by a debounced background save, so a burst of
+    edits costs one compacted write instead of one per change. BM25 uses an
+    in-memory inverted index over `tokenize_text` tokens, so a query touches
+    only the postings of its own terms plus one matrix-vector product.
+    """
+
+    def __init__(self, index_dir: str = KB_INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.RLock()
+        self._articles: Dict[str, Dict] = {}      # id -> {title, text, row, tf, length}
+        self._row_ids: List[Optional[str]] = []   # row -> id (None when freed)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()  # One writer at a time
+        self._load()
+
+    # ------------------------------------------------------------------ state
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.index_dir, "articles.json")
+        matrix_path = os.path.join(self.index_dir, "embeddings.npy")
+        if not os.path.isfile(meta_path) or not os.path.isfile(matrix_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            articles = json.load(f)
+        self._matrix = np.load(matrix_path, mmap_mode="r")
+        for row, article in enumerate(articles):
+            self._index_article(article["id"], article["title"], article["text"], row, article["tf"])
+        logger.info(f"Loaded KB index with {len(self._articles)} articles from {self.index_dir}")
+
+    def _index_article(self, article_id: str, title: str, text: str, row: int, tf: Dict[str, int]) -> None:
+        length = sum(tf.values())
+        self._articles[article_id] = {"title": title, "text": text, "row": row, "tf": tf, "length": length}
+        while len(self._row_ids) <= row:
+            self._row_ids.append(None)
+        self._row_ids[row] = article_id
+        self._total_length += length
+        for term, count in tf.items():
+            self._postings.setdefault(term, {})[row] = count
+
+    def _unindex_article(self, article_id: str) -> None:
+        article = self._articles.pop(article_id)
+        row = article["row"]
+        self._row_ids[row] = None
+        self._total_length -= article["length"]
+        for term in article["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _append_rows(self, vectors: np.ndarray) -> int:
+        """Append embedding rows, growing a writable buffer geometrically"""
+        used = len(self._row_ids)
+        needed = used + len(vectors)
+        # A memory-mapped matrix from disk is read-only; copy it on first write
+        if type(self._matrix) is not np.ndarray or needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * self._matrix.shape[0], 64)
+            grown = np.zeros((capacity, EMBEDDING_DIM), dtype=np.float32)
+            grown[:used] = self._matrix[:used]
+            self._matrix = grown
+        self._matrix[used:needed] = vectors
+        return used
+
+    # -------------------------------------------------------------- mutations
+
+    def upsert(self, articles: List[Dict]) -> List[str]:
+        """
+        Add or replace articles ({"id", "title", "text"}) and schedule a save.
+
+        New text is embedded in one batch before the index lock is taken.
+        """
+        if not articles:
+            return []
+        vectors = embedder.get_embeddings([f"{a.get('title', '')}\n{a['text']}".strip() for a in articles])
+        with self._lock:
+            first_row = self._append_rows(vectors)
+            for offset, article in enumerate(articles):
+                article_id = str(article["id"])
+                if article_id in self._articles:
+                    self._unindex_article(article_id)
+                title = article.get("title") or ""
+                tf = dict(Counter(tokenize_text(f"{title} {article['text']}")))
+                self._index_article(article_id, title, article["text"], first_row + offset, tf)
+            self._schedule_save()
+        return [str(a["id"]) for a in articles]
+
+    def delete(self, article_id: str) -> bool:
+        """Remove an article; returns False if it was not indexed"""
+        with self._lock:
+            if article_id not in self._articles:
+                return False
+            self._unindex_article(article_id)
+            self._schedule_save()
+            return True
+
+    def _schedule_save(self) -> None:
+        """Mark the index dirty and start the debounce timer if none is pending"""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self) -> None:
+        """
+        Write pending changes as a compacted copy (atomic replace of both files).
+
+        The snapshot is taken under the index lock; the files are written
+        outside it, so searches and edits are not blocked by disk I/O.
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                matrix, articles = self._compact_snapshot()
+
+            os.makedirs(self.index_dir, exist_ok=True)
+            matrix_tmp = os.path.join(self.index_dir, "embeddings.tmp.npy")
+            meta_tmp = os.path.join(self.index_dir, "articles.json.tmp")
+            np.save(matrix_tmp, matrix)
+            with open(meta_tmp, "w", encoding="utf-8") as f:
+                json.dump(articles, f)
+            os.replace(matrix_tmp, os.path.join(self.index_dir, "embeddings.npy"))
+            os.replace(meta_tmp, os.path.join(self.index_dir, "articles.json"))
+
+    def _compact_snapshot(self):
+        """Live rows and article records; compacts memory once freed rows dominate"""
+        live = [(row, aid) for row, aid in enumerate(self._row_ids) if aid is not None]
+        matrix = np.asarray(self._matrix[[row for row, _ in live]], dtype=np.float32) \
+            if live else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        articles = [
+            {"id": aid, "title": self._articles[aid]["title"],
+             "text": self._articles[aid]["text"], "tf": self._articles[aid]["tf"]}
+            for _, aid in live
+        ]
+
+        # Freed rows stay in memory until they outnumber live ones
+        if len(self._row_ids) > 2 * len(live) + 64:
+            self._articles.clear()
+            self._row_ids = []
+            self._postings = {}
+            self._total_length = 0
+            self._matrix = matrix.copy()
+            for row, article in enumerate(articles):
+                self._index_article(article["id"], article["title"], article["text"], row, article["tf"])
+        return matrix, articles
+
+    # ---------------------------------------------------------------- queries
+
+    def _bm25(self, terms: List[str]) -> Dict[int, float]:
+        n_docs = len(self._articles)
+        avg_length = self._total_length / n_docs if n_docs else 0.0
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings.items():
+                length = self._articles[self._row_ids[row]]["length"]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / max(avg_length, 1e-9))
+                scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def search(self, query: str, top_k: int = 3, query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Rank articles for a query by hybrid BM25 + embedding similarity.
+
+        Args:
+            query: Free-text query (e.g. the ticket text)
+            top_k: Number of articles to return
+            query_vector: Precomputed unit-normalized query embedding
+
+        Returns:
+            List of {"id", "title", "text", "score", "bm25", "similarity"}
+        """
+        if not self._articles:
+            return []
+        if query_vector is None:
+            query_vector = embedder.get_embeddings([query])[0]
+
+        with self._lock:
+            used = len(self._row_ids)
+            similarity = np.asarray(self._matrix[:used] @ query_vector, dtype=np.float32)
+            alive = np.array([aid is not None for aid in self._row_ids], dtype=bool)
+
+            bm25 = np.zeros(used, dtype=np.float32)
+            for row, score in self._bm25(tokenize_text(query)).items():
+                bm25[row] = score
+            bm25_norm = bm25 / bm25.max() if bm25.max() > 0 else bm25
+
+            combined = HYBRID_ALPHA * similarity + (1 - HYBRID_ALPHA) * bm25_norm
+            combined[~alive] = -np.inf
+            k = min(top_k, int(alive.sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-combined, k - 1)[:k]
+            top = top[np.argsort(-combined[top])]
+
+            results = []
+            for row in top:
+                article_id = self._row_ids[row]
+                article = self._articles[article_id]
+                results.append({
+                    "id": article_id,
+                    "title": article["title"],
+                    "text": article["text"],
+                    "score": round(float(combined[row]), 4),
+                    "bm25": round(float(bm25[row]), 4),
+                    "similarity": round(float(similarity[row]), 4)
+                })
+            return results
+
+    def info(self) -> Dict:
+        return {
+            "articles": len(self._articles),
+            "terms": len(self._postings),
+            "rows": len(self._row_ids),
+            "index_dir": self.index_dir,
+            "hybrid_alpha": HYBRID_ALPHA
+        }
+
+
+_index: Optional[KnowledgeBaseIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> KnowledgeBaseIndex:
+    """Process-wide KB index, loaded from KB_INDEX_DIR on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = KnowledgeBaseIndex(KB_INDEX_DIR)
+    return _index
+
+
+def flush() -> None:
+    """Write any pending KB changes now (no-op if the index was never loaded)"""
+    if _index is not None:
+        _index.save()
+
+
+def known_empty() -> bool:
+    """True only if the index is loaded and holds no articles (never loads it)"""
+    return _index is not None and len(_index) == 0
+
+
+# Entry points for the worker pool: each one loads the index on first use,
+# so parsing articles.json and building postings never runs on the event loop
+
+def retrieve_snippets(text: str, top_k: int = 3) -> List[Dict]:
+    """Top KB articles for a ticket, for use as reply context ([] if empty)"""
+    index = get_index()
+    if len(index) == 0:
+        return []
+    return index.search(text, top_k=top_k)
+
+
+def upsert_articles(articles: List[Dict]) -> Tuple[List[str], int]:
+    """Upsert articles; returns (ids, total articles)"""
+    index = get_index()
+    return index.upsert(articles), len(index)
+
+
+def delete_article(article_id: str) -> Optional[int]:
+    """Delete an article; returns the remaining total, or None if it was absent"""
+    index = get_index()
+    return len(index) if index.delete(article_id) else None
+
+
+def search(query: str, top_k: int = 3) -> Tuple[List[Dict], int]:
+    """Hybrid search; returns (results, total articles)"""
+    index = get_index()
+    return index.search(query, top_k=top_k), len(index)
+
+
+def info() -> Dict:
+    return get_index().info()
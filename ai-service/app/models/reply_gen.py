@@ -1,7 +1,13 @@
 import os
+import time
 import requests
 from typing import Dict, List, Optional
 import logging
+from app.utils import decoding
+from app.utils.model_cache import lazy_model, load_pipeline
+from app.utils.request_context import (
+    RequestCancelled, check_cancelled, network_timeout, stopping_criteria
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +19,19 @@ REPLY_MODE = os.getenv("REPLY_MODE", "openai" if OPENAI_API_KEY else "local")
 OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 OPENAI_MODEL = "gpt-4o-mini"  # Cost-effective model, can upgrade to gpt-4
 
+# Local fallback generator (google/flan-t5-base, ~250MB, CPU-friendly),
+# loaded once on first local request instead of on every call
+local_generator = lazy_model(
+    "reply_local", lambda: load_pipeline("reply_local", device=-1)  # Force CPU
+)
+
 
 def generate_reply(
     ticket_text: str,
     kb_context: Optional[List[str]] = None,
-    tone: str = "polite"
+    tone: str = "polite",
+    latency_budget_ms: Optional[float] = None,
+    quality: Optional[str] = None
 ) -> Dict:
     """
     Generate a draft reply for a support ticket using RAG-style approach.
@@ -30,6 +44,10 @@ def generate_reply(
         ticket_text: The customer complaint or support ticket
         kb_context: Optional list of relevant KB articles/snippets for context
         tone: Response tone - "polite", "friendly", "professional", "empathetic"
+        latency_budget_ms: Target generation time; for the local model picks
+            sampling vs. greedy/beam and max new tokens from the calibrated
+            decoding profile, for APIs bounds the request timeout
+        quality: "best", "balanced" or "fast" decoding tier (local model)
     
     Returns:
         Dict containing:
@@ -38,7 +56,10 @@ def generate_reply(
             - model: Model/API used for generation
             - needs_human_review: Boolean flag for manual review requirement
             - tone_used: The tone applied
+            - decoding: Chosen decoding strategy and parameters
+            - elapsed_ms: Actual generation time
     """
+    start = time.monotonic()
     
     # Validate inputs
     if not ticket_text or len(ticket_text.strip()) < 10:
@@ -54,12 +75,28 @@ def generate_reply(
     
     # Choose generation method based on configuration
     if REPLY_MODE == "openai" and OPENAI_API_KEY:
-        return _generate_reply_openai(ticket_text, context_text, tone)
+        result = _generate_reply_openai(ticket_text, context_text, tone, latency_budget_ms)
     else:
-        return _generate_reply_local(ticket_text, context_text, tone)
+        plan = decoding.choose_strategy("reply_local", 200, latency_budget_ms, quality)
+        result = _generate_reply_local(ticket_text, context_text, tone, plan, latency_budget_ms)
+    
+    result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return result
+
 
+def _api_timeout(latency_budget_ms: Optional[float], default: float = 30) -> float:
+    """Request timeout in seconds, bounded by the latency budget and deadline"""
+    if latency_budget_ms is not None:
+        default = min(default, max(latency_budget_ms / 1000.0, 0.001))
+    return network_timeout(default)
 
-def _generate_reply_openai(ticket_text: str, context_text: str, tone: str) -> Dict:
+
+def _generate_reply_openai(
+    ticket_text: str,
+    context_text: str,
+    tone: str,
+    latency_budget_ms: Optional[float] = None
+) -> Dict:
     """
     Generate reply using OpenAI ChatCompletion API.
     
@@ -115,7 +152,7 @@ Requirements:
             OPENAI_API_URL,
             headers=headers,
             json=payload,
-            timeout=30
+            timeout=_api_timeout(latency_budget_ms)
         )
         
         if response.status_code != 200:
@@ -139,10 +176,12 @@ Requirements:
             "model": f"openai/{OPENAI_MODEL}",
             "needs_human_review": confidence < 0.8,
             "tone_used": tone,
-            "source": "OpenAI API"
+            "source": "OpenAI API",
+            "decoding": {"strategy": "api", "temperature": 0.7, "max_tokens": 300}
         }
         
     except requests.exceptions.RequestException as e:
+        check_cancelled()  # Timeout clamped to the deadline is not an API failure
         logger.error(f"Network error calling OpenAI API: {str(e)}")
         raise Exception(f"Failed to generate reply via OpenAI: {str(e)}")
     except Exception as e:
@@ -150,7 +189,13 @@ Requirements:
         raise
 
 
-def _generate_reply_local(ticket_text: str, context_text: str, tone: str) -> Dict:
+def _generate_reply_local(
+    ticket_text: str,
+    context_text: str,
+    tone: str,
+    plan: Optional[Dict] = None,
+    latency_budget_ms: Optional[float] = None
+) -> Dict:
     """
     Generate reply using local Hugging Face model.
     
@@ -175,38 +220,43 @@ def _generate_reply_local(ticket_text: str, context_text: str, tone: str) -> Dic
         # Option 1: Try using HF Inference API if key is available
         hf_api_key = os.getenv("HF_API_KEY")
         if hf_api_key:
-            return _generate_reply_hf_api(ticket_text, context_text, tone, hf_api_key)
+            return _generate_reply_hf_api(ticket_text, context_text, tone, hf_api_key, latency_budget_ms)
         
         # Option 2: Use small local model (flan-t5-base)
         # This is CPU-friendly but may produce generic responses
-        from transformers import pipeline
-        
         try:
-            # Attempt to load a smaller model suitable for CPU
-            generator = pipeline(
-                "text2text-generation",
-                model="google/flan-t5-base",  # 250MB model, works on CPU
-                device=-1  # Force CPU
-            )
+            generator = local_generator.get()
             
             prompt = f"""Write a {tone} customer support response to this ticket:
 Ticket: {ticket_text}
 {context_text}
 Response:"""
             
-            result = generator(
-                prompt,
-                max_length=200,
-                temperature=0.7,
-                do_sample=True
-            )
+            # Decoding from the latency budget / quality tier, else the
+            # default of sampling up to 200 tokens
+            if plan is not None:
+                generate_kwargs = dict(plan["generate"], max_new_tokens=plan["max_new_tokens"])
+            else:
+                generate_kwargs = {"max_length": 200, "temperature": 0.7, "do_sample": True}
+            
+            # Sampling loop stops between tokens if the caller is gone
+            criteria = stopping_criteria()
+            if criteria is not None:
+                generate_kwargs["stopping_criteria"] = criteria
+            
+            result = generator(prompt, **generate_kwargs)
+            check_cancelled()  # Discard output truncated by cancellation
             
             draft_reply = result[0]['generated_text'].strip()
+            decoding_used = decoding.describe(plan)
             
+        except RequestCancelled:
+            raise
         except Exception as model_error:
             logger.warning(f"Local model failed: {model_error}. Using template response.")
             # Fallback: Template-based response
             draft_reply = _generate_template_response(ticket_text, tone)
+            decoding_used = {"strategy": "template"}
         
         # Calculate confidence (lower for local/template responses)
         confidence = _calculate_confidence(
@@ -222,15 +272,24 @@ Response:"""
             "model": "local/flan-t5-base",
             "needs_human_review": True,  # Always require review for local generation
             "tone_used": tone,
-            "source": "Local model (limited capability)"
+            "source": "Local model (limited capability)",
+            "decoding": decoding_used
         }
         
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in local reply generation: {str(e)}")
         raise Exception(f"Failed to generate reply locally: {str(e)}")
 
 
-def _generate_reply_hf_api(ticket_text: str, context_text: str, tone: str, api_key: str) -> Dict:
+def _generate_reply_hf_api(
+    ticket_text: str,
+    context_text: str,
+    tone: str,
+    api_key: str,
+    latency_budget_ms: Optional[float] = None
+) -> Dict:
     """
     Generate reply using Hugging Face Inference API.
     
@@ -265,7 +324,7 @@ Keep response under 150 words and provide clear next steps. [/INST]"""
     }
     
     try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
+        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=_api_timeout(latency_budget_ms))
         
         if response.status_code != 200:
             raise Exception(f"HF API returned status {response.status_code}")
@@ -286,14 +345,40 @@ Keep response under 150 words and provide clear next steps. [/INST]"""
             "model": "hf-inference/llama-2-7b-chat",
             "needs_human_review": confidence < 0.8,
             "tone_used": tone,
-            "source": "Hugging Face Inference API"
+            "source": "Hugging Face Inference API",
+            "decoding": {"strategy": "api", "temperature": 0.7, "top_p": 0.9, "max_new_tokens": 250}
         }
         
     except Exception as e:
+        check_cancelled()
         logger.error(f"HF Inference API error: {str(e)}")
         raise
 
 
+def generate_template_reply(ticket_text: str, tone: str = "polite") -> Dict:
+    """
+    Template-only reply with no model or API call.
+    
+    Used as the cheap answer when the service sheds /reply load; always
+    flagged for human review.
+    """
+    draft_reply = _generate_template_response(ticket_text, tone)
+    return {
+        "draft_reply": draft_reply,
+        "confidence": round(_calculate_confidence(
+            draft_reply=draft_reply,
+            has_kb_context=False,
+            ticket_length=len(ticket_text),
+            reply_length=len(draft_reply)
+        ) * 0.7, 2),
+        "model": "template",
+        "needs_human_review": True,
+        "tone_used": tone,
+        "source": "Template (service under load)",
+        "decoding": {"strategy": "template"}
+    }
+
+
 def _generate_template_response(ticket_text: str, tone: str) -> str:
     """
     Fallback template-based response when models are unavailable.
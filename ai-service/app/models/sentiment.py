@@ -1,23 +1,177 @@
-from transformers import pipeline
-from typing import Dict
+from typing import Dict, List, Tuple
+import os
+import re
+from app.utils.model_cache import lazy_model, load_pipeline
 
-# Initialize sentiment analyzer
+# Sentiment analyzer (DistilBERT SST-2), loaded on first use
 # Note: To use HF Inference API instead, change to:
 # sentiment_analyzer = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english", api_key=os.getenv("HF_API_KEY"))
-sentiment_analyzer = pipeline("sentiment-analysis", model="distilbert/distilbert-base-uncased-finetuned-sst-2-english")
+sentiment_analyzer = lazy_model("sentiment", lambda: load_pipeline("sentiment"))
 
-def analyze_sentiment(text: str) -> Dict:
+# Long-text mode configuration
+MAX_MODEL_TOKENS = 510          # DistilBERT limit (512) minus [CLS]/[SEP]
+MIN_SEGMENT_TOKENS = 48         # Merge short sentences up to at least this size
+# A NEGATIVE final segment this far below the first one sets the headline label
+NEGATIVE_SHIFT = float(os.getenv("SENTIMENT_NEGATIVE_SHIFT", "0.5"))
+MAX_SEGMENTS = int(os.getenv("SENTIMENT_MAX_SEGMENTS", "32"))
+# Default covers every segment, so long mode is one forward pass
+BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE") or MAX_SEGMENTS)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def analyze_sentiment(text: str, mode: str = "single") -> Dict:
     """
     Analyze sentiment of input text.
-    
+
     Args:
         text: Input text to analyze
-    
+        mode: "single" scores the text in one pass, "long" scores sentence
+            windows in one batch (see `analyze_sentiment_long`), "auto" uses
+            long mode only when the text exceeds the model's 512-token limit
+            (shorter texts get the same single-pass result as before)
+
     Returns:
-        Dict containing sentiment label and score
+        Dict containing sentiment label and score (plus aggregate and
+        segment trajectory in long mode)
     """
-    result = sentiment_analyzer(text)[0]
+    if mode == "long" or (mode == "auto" and _needs_long_mode(text)):
+        return analyze_sentiment_long(text)
+
+    result = sentiment_analyzer.get()(text, truncation=True)[0]
     return {
         "label": result["label"],
         "score": float(result["score"])
     }
+
+
+def analyze_sentiment_long(text: str) -> Dict:
+    """
+    Score long text as a trajectory of sentence windows in one batched pass.
+
+    Sentences are packed into windows so the number of segments stays near
+    SENTIMENT_MAX_SEGMENTS however long the text grows, and all windows go
+    through the model together. The headline label is normally taken from the
+    token-weighted mean positive probability, but when the text ends on a
+    NEGATIVE segment at least NEGATIVE_SHIFT below where it started, the
+    final segment's label and score are used instead, so a long calm opening
+    cannot mask a furious ending.
+
+    Args:
+        text: Input text of any length
+
+    Returns:
+        Dict containing:
+            - label / score: Headline label and its probability
+            - label_source: "mean" or "final" (negative turn at the end)
+            - positive_probability: Token-weighted mean P(POSITIVE)
+            - final: Label and score of the last segment
+            - trend: Change in P(POSITIVE) from first to last segment
+            - segments: Per-window label, score, char offsets and token count
+    """
+    segments = _segment(text)
+    if not segments:
+        raise ValueError("Text is empty")
+
+    outputs = sentiment_analyzer.get()(
+        [text[start:end] for start, end, _ in segments],
+        batch_size=BATCH_SIZE,
+        truncation=True
+    )
+
+    trajectory = []
+    weighted = 0.0
+    total_tokens = 0
+    for (start, end, tokens), output in zip(segments, outputs):
+        score = float(output["score"])
+        positive = score if output["label"] == "POSITIVE" else 1.0 - score
+        weighted += positive * tokens
+        total_tokens += tokens
+        trajectory.append({
+            "start": start,
+            "end": end,
+            "tokens": tokens,
+            "label": output["label"],
+            "score": score,
+            "positive_probability": round(positive, 4)
+        })
+
+    positive = weighted / max(total_tokens, 1)
+    final = trajectory[-1]
+    trend = final["positive_probability"] - trajectory[0]["positive_probability"]
+    if final["label"] == "NEGATIVE" and trend <= -NEGATIVE_SHIFT:
+        label, score, source = "NEGATIVE", final["score"], "final"
+    else:
+        label = "POSITIVE" if positive >= 0.5 else "NEGATIVE"
+        score, source = positive if label == "POSITIVE" else 1.0 - positive, "mean"
+    return {
+        "label": label,
+        "score": round(score, 4),
+        "label_source": source,
+        "positive_probability": round(positive, 4),
+        "final": {"label": final["label"], "score": final["score"]},
+        "trend": round(trend, 4),
+        "mode": "long",
+        "segment_count": len(trajectory),
+        "segments": trajectory
+    }
+
+
+def _needs_long_mode(text: str) -> bool:
+    # Cheap check before tokenizing: every token covers at least one
+    # character, so a text this short always fits in one pass
+    if len(text) <= MAX_MODEL_TOKENS:
+        return False
+    return len(sentiment_analyzer.get().tokenizer(text, add_special_tokens=False)["input_ids"]) > MAX_MODEL_TOKENS
+
+
+def _segment(text: str) -> List[Tuple[int, int, int]]:
+    """
+    Split text into (start, end, tokens) windows of whole sentences.
+
+    All sentences are tokenized in one call. Windows grow to at least
+    total_tokens / MAX_SEGMENTS so the segment count is bounded, and never
+    exceed the model limit; an over-long sentence is cut on token offsets.
+    """
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    if not spans:
+        return []
+
+    encoded = sentiment_analyzer.get().tokenizer(
+        [text[s:e] for s, e in spans],
+        add_special_tokens=False,
+        return_offsets_mapping=True
+    )
+
+    # Break sentences longer than the model limit into token windows
+    pieces = []
+    for (s, e), offsets in zip(spans, encoded["offset_mapping"]):
+        if len(offsets) <= MAX_MODEL_TOKENS:
+            pieces.append((s, e, max(len(offsets), 1)))
+            continue
+        for i in range(0, len(offsets), MAX_MODEL_TOKENS):
+            window = offsets[i:i + MAX_MODEL_TOKENS]
+            pieces.append((s + window[0][0], s + window[-1][1], len(window)))
+
+    total_tokens = sum(tokens for _, _, tokens in pieces)
+    target = min(MAX_MODEL_TOKENS, max(MIN_SEGMENT_TOKENS, -(-total_tokens // MAX_SEGMENTS)))
+
+    # Greedily pack consecutive pieces into windows of about `target` tokens
+    segments = []
+    seg_start, seg_end, seg_tokens = pieces[0]
+    for s, e, tokens in pieces[1:]:
+        if seg_tokens >= target or seg_tokens + tokens > MAX_MODEL_TOKENS:
+            segments.append((seg_start, seg_end, seg_tokens))
+            seg_start, seg_end, seg_tokens = s, e, tokens
+        else:
+            seg_end = e
+            seg_tokens += tokens
+    segments.append((seg_start, seg_end, seg_tokens))
+    return segments
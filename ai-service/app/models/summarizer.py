@@ -1,46 +1,84 @@
-from transformers import pipeline
-from typing import Dict
+from typing import Dict, List, Optional
 import logging
+import os
+import re
+import time
+import numpy as np
+from app.utils import decoding, inference_pool
+from app.utils.text_processing import tokenize_text
+from app.utils.model_cache import lazy_model, load_pipeline
+from app.utils.request_context import RequestCancelled, check_cancelled, stopping_criteria
 
 logger = logging.getLogger(__name__)
 
-# Initialize summarization pipeline
+# Summarization pipeline, loaded on first use
 # Model: facebook/bart-large-cnn - optimized for abstractive summarization
-# Note: First run will download ~1.6GB model to cache
-try:
-    summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-    logger.info("Summarization model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load summarization model: {e}")
-    summarizer = None
+# Note: First load downloads ~1.6GB unless a local snapshot exists
+summarizer = lazy_model("summarizer", lambda: load_pipeline("summarizer"))
 
+# Auto mode: inputs up to this many words get the extractive fast path, and so
+# does anything once this many abstractive jobs are already queued
+AUTO_EXTRACTIVE_MAX_WORDS = int(os.getenv("SUMMARY_AUTO_EXTRACTIVE_MAX_WORDS", "500"))
+AUTO_MAX_QUEUE_DEPTH = int(os.getenv("SUMMARY_AUTO_MAX_QUEUE_DEPTH", "2"))
 
-def summarize_text(text: str, max_length: int = 120, min_length: int = 30) -> Dict:
+REDUNDANCY_THRESHOLD = 0.8  # Cosine similarity above which a sentence is a repeat
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def summarize_text(
+    text: str,
+    max_length: int = 120,
+    min_length: int = 30,
+    mode: str = "abstractive",
+    latency_budget_ms: Optional[float] = None,
+    quality: Optional[str] = None
+) -> Dict:
     """
-    Generate an abstractive summary of the input text.
+    Summarize the input text.
     
     Args:
         text: Input text to summarize (complaint, conversation, etc.)
         max_length: Maximum length of summary in tokens
         min_length: Minimum length of summary in tokens
+        mode: "abstractive" (BART beam search), "extractive" (TextRank over
+            TF-IDF sentence vectors, tens of milliseconds on CPU) or "auto"
+            (see `choose_mode`)
+        latency_budget_ms: Target generation time; picks beam count and
+            max tokens from the calibrated decoding profile
+        quality: "best", "balanced" or "fast" decoding tier
     
     Returns:
         Dict containing:
             - summary: The generated summary text
             - model: Name of the model used
+            - mode: "abstractive" or "extractive"
             - input_length: Character count of input
             - summary_length: Character count of output
+            - decoding: Chosen strategy and parameters
+            - elapsed_ms: Actual time spent
     
     Raises:
         Exception: If summarization fails or model not loaded
     """
-    if summarizer is None:
-        raise Exception("Summarization model not loaded. Check logs for initialization errors.")
-    
     # Validate input
     if not text or len(text.strip()) < 50:
         raise ValueError("Input text too short for summarization (minimum 50 characters)")
     
+    start = time.monotonic()
+    if mode == "auto":
+        mode = choose_mode(text, latency_budget_ms)
+    if mode == "extractive":
+        result = summarize_extractive(text, max_length=max_length)
+        result["decoding"] = {"strategy": "extractive"}
+        result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return result
+    
+    try:
+        model = summarizer.get()
+    except Exception:
+        raise Exception("Summarization model not loaded. Check logs for initialization errors.")
+    
     try:
         # BART works best with text between 100-1024 tokens
         # Truncate if too long to avoid memory issues on CPU
@@ -49,24 +87,134 @@ def summarize_text(text: str, max_length: int = 120, min_length: int = 30) -> Di
             logger.warning(f"Input text truncated from {len(text)} to ~{max_input_length * 4} characters")
             text = text[:max_input_length * 4]
         
-        # Generate summary
-        result = summarizer(
+        # Decoding parameters from the latency budget / quality tier, if any
+        plan = decoding.choose_strategy("summarizer", max_length, latency_budget_ms, quality)
+        generate_kwargs = {"do_sample": False}  # Deterministic output
+        if plan is not None:
+            generate_kwargs.update(plan["generate"])
+            max_length = plan["max_new_tokens"]
+            min_length = min(min_length, max_length // 2)
+        
+        # Generate summary; beam search stops between steps if the caller is gone
+        criteria = stopping_criteria()
+        if criteria is not None:
+            generate_kwargs["stopping_criteria"] = criteria
+        
+        result = model(
             text,
             max_length=max_length,
             min_length=min_length,
-            do_sample=False,  # Deterministic output
-            truncation=True
+            truncation=True,
+            **generate_kwargs
         )
+        check_cancelled()  # Discard output truncated by cancellation
         
         summary_text = result[0]['summary_text']
         
         return {
             "summary": summary_text,
             "model": "facebook/bart-large-cnn",
+            "mode": "abstractive",
             "input_length": len(text),
-            "summary_length": len(summary_text)
+            "summary_length": len(summary_text),
+            "decoding": decoding.describe(plan),
+            "elapsed_ms": round((time.monotonic() - start) * 1000, 1)
         }
         
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Summarization failed: {str(e)}")
         raise Exception(f"Failed to generate summary: {str(e)}")
+
+
+def choose_mode(text: str, latency_budget_ms: Optional[float] = None) -> str:
+    """
+    Pick the summarization mode for `mode="auto"`.
+    
+    Extractive when the input is short enough that BART is overkill, when
+    abstractive work is already backed up on the summarizer, or when even the
+    fastest decoding strategy cannot fit the latency budget; abstractive
+    otherwise.
+    """
+    if len(text.split()) <= AUTO_EXTRACTIVE_MAX_WORDS:
+        return "extractive"
+    fastest = decoding.STRATEGIES["summarizer"][-1]["name"]
+    if latency_budget_ms is not None and \
+            decoding.predict_ms("summarizer", fastest, decoding.MIN_NEW_TOKENS) > latency_budget_ms:
+        return "extractive"
+    if inference_pool.get_executor("summarizer").queue_depth >= AUTO_MAX_QUEUE_DEPTH:
+        return "extractive"
+    return "abstractive"
+
+
+def summarize_extractive(text: str, max_length: int = 120) -> Dict:
+    """
+    Extractive summary: TextRank over TF-IDF sentence vectors.
+    
+    Builds an L2-normalized TF-IDF matrix for the sentences, takes the cosine
+    similarity matrix as one matrix product, and ranks sentences by power
+    iteration (PageRank, damping 0.85). The best sentences are returned in
+    their original order until the word budget (`max_length`) is reached,
+    skipping near-repeats of sentences already chosen. Pure NumPy, no model
+    load.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+    if len(sentences) <= 1:
+        summary_text = _truncate_words(text.strip(), max_length)
+    else:
+        scores, similarity = _textrank(sentences)
+        chosen: List[int] = []
+        words = 0
+        for index in np.argsort(-scores, kind="stable"):
+            length = len(sentences[index].split())
+            if chosen and words + length > max_length:
+                continue
+            # Skip sentences that repeat one already chosen
+            if chosen and similarity[index, chosen].max() > REDUNDANCY_THRESHOLD:
+                continue
+            chosen.append(int(index))
+            words += length
+        summary_text = " ".join(_truncate_words(sentences[i], max_length) for i in sorted(chosen))
+    
+    return {
+        "summary": summary_text,
+        "model": "extractive/textrank-tfidf",
+        "mode": "extractive",
+        "input_length": len(text),
+        "summary_length": len(summary_text)
+    }
+
+
+def _textrank(sentences: List[str], damping: float = 0.85, iterations: int = 30):
+    """Return (TextRank scores, cosine similarity matrix) for the sentences"""
+    tokens = [tokenize_text(sentence) for sentence in sentences]
+    vocabulary = {term: i for i, term in enumerate(sorted({t for ts in tokens for t in ts}))}
+    if not vocabulary:
+        return np.ones(len(sentences)), np.zeros((len(sentences), len(sentences)))
+    
+    tf = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(tokens):
+        for term in terms:
+            tf[row, vocabulary[term]] += 1
+    df = np.count_nonzero(tf, axis=0)
+    tfidf = tf * np.log((1 + len(sentences)) / (1 + df) + 1)
+    tfidf /= np.maximum(np.linalg.norm(tfidf, axis=1, keepdims=True), 1e-9)
+    
+    similarity = tfidf @ tfidf.T
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, row_sums, out=np.full_like(similarity, 1.0 / len(sentences)), where=row_sums > 0)
+    
+    scores = np.full(len(sentences), 1.0 / len(sentences), dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - damping) / len(sentences) + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated, similarity
+        scores = updated
+    return scores, similarity
+
+
+def _truncate_words(text: str, max_words: int) -> str:
+    words = text.split()
+    return text if len(words) <= max_words else " ".join(words[:max_words]) + "..."
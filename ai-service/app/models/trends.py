@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.utils.text_processing import tokenize_text
+
+# Online topic clustering of complaint embeddings (fed by /embed). Each
+# embedding joins its nearest centroid if cosine similarity is at least
+# TREND_JOIN_THRESHOLD, else starts a cluster; at TREND_MAX_CLUSTERS the
+# least active cluster is recycled. Counts are kept per time bucket in a ring.
+JOIN_THRESHOLD = float(os.getenv("TREND_JOIN_THRESHOLD", "0.6"))
+MAX_CLUSTERS = int(os.getenv("TREND_MAX_CLUSTERS", "256"))
+BUCKET_SECONDS = int(os.getenv("TREND_BUCKET_SECONDS", "900"))
+NUM_BUCKETS = int(os.getenv("TREND_BUCKETS", "96"))  # 24h of 15-minute buckets
+EMBEDDING_DIM = 384
+
+# Per-centroid learning rate is 1/n as in mini-batch k-means, floored so
+# long-lived clusters keep following topic drift
+MIN_LEARNING_RATE = 0.01
+MAX_TERMS = 64  # Term counts kept per cluster for labelling
+SAMPLE_TEXTS = 3
+
+
+class TrendEngine:
+    """
+    Streaming clustering with time-bucketed volume per cluster.
+
+    State is fixed-size: a (MAX_CLUSTERS, dim) centroid matrix, a
+    (MAX_CLUSTERS, NUM_BUCKETS) count ring and small per-cluster term
+    counters, so each update costs O(MAX_CLUSTERS * dim) regardless of how
+    many complaints have been seen and nothing is ever re-clustered.
+    """
+
+    def __init__(self, max_clusters: int = MAX_CLUSTERS, num_buckets: int = NUM_BUCKETS,
+                 bucket_seconds: int = BUCKET_SECONDS, join_threshold: float = JOIN_THRESHOLD):
+        self.max_clusters = max_clusters
+        self.num_buckets = num_buckets
+        self.bucket_seconds = bucket_seconds
+        self.join_threshold = join_threshold
+        self._centroids = np.zeros((max_clusters, EMBEDDING_DIM), dtype=np.float32)
+        self._counts = np.zeros((max_clusters, num_buckets), dtype=np.int32)
+        self._totals = np.zeros(max_clusters, dtype=np.int64)
+        self._active = np.zeros(max_clusters, dtype=bool)
+        self._meta: List[Optional[Dict]] = [None] * max_clusters
+        self._bucket: Optional[int] = None  # Absolute index of the newest bucket
+        self._lock = threading.Lock()
+        self.stats = {"observed": 0, "clusters_created": 0, "clusters_recycled": 0}
+
+    def _advance(self, now: float) -> int:
+        """Move the ring to the bucket for `now`, clearing buckets skipped over"""
+        bucket = int(now // self.bucket_seconds)
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket > self._bucket:
+            for b in range(self._bucket + 1, min(bucket, self._bucket + self.num_buckets) + 1):
+                self._counts[:, b % self.num_buckets] = 0
+            self._bucket = bucket
+        return self._bucket
+
+    def _new_cluster(self, vector: np.ndarray, now: float) -> int:
+        free = np.flatnonzero(~self._active)
+        if len(free):
+            slot = int(free[0])
+        else:
+            # Recycle the cluster with the least volume in the retained window
+            slot = int(np.argmin(self._counts.sum(axis=1)))
+            self.stats["clusters_recycled"] += 1
+        self._centroids[slot] = vector
+        self._counts[slot] = 0
+        self._totals[slot] = 0
+        self._active[slot] = True
+        self._meta[slot] = {"id": uuid.uuid4().hex[:12], "created": now, "terms": Counter(), "samples": []}
+        self.stats["clusters_created"] += 1
+        return slot
+
+    def observe(self, embedding: np.ndarray, text: Optional[str] = None, now: Optional[float] = None) -> Dict:
+        """
+        Assign one complaint embedding to a cluster and count it.
+
+        Returns:
+            {"cluster_id", "similarity", "new_cluster"}
+        """
+        now = time.time() if now is None else now
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            raise ValueError("Cannot cluster a zero embedding")
+        vector = vector / norm
+
+        with self._lock:
+            bucket = self._advance(now)
+            similarity = -1.0
+            if self._active.any():
+                scores = self._centroids @ vector
+                scores[~self._active] = -np.inf
+                slot = int(np.argmax(scores))
+                similarity = float(scores[slot])
+            new_cluster = similarity < self.join_threshold
+            if new_cluster:
+                slot = self._new_cluster(vector, now)
+                similarity = 1.0
+            else:
+                rate = max(1.0 / (self._totals[slot] + 1), MIN_LEARNING_RATE)
+                centroid = (1 - rate) * self._centroids[slot] + rate * vector
+                self._centroids[slot] = centroid / np.linalg.norm(centroid)
+
+            self._counts[slot, bucket % self.num_buckets] += 1
+            self._totals[slot] += 1
+            meta = self._meta[slot]
+            meta["last_seen"] = now
+            if text:
+                meta["terms"].update(t for t in tokenize_text(text) if len(t) > 3)
+                if len(meta["terms"]) > 2 * MAX_TERMS:
+                    meta["terms"] = Counter(dict(meta["terms"].most_common(MAX_TERMS)))
+                sample = text[:200]
+                if len(meta["samples"]) < SAMPLE_TEXTS and sample not in meta["samples"]:
+                    meta["samples"].append(sample)
+            self.stats["observed"] += 1
+            return {"cluster_id": meta["id"], "similarity": round(similarity, 4), "new_cluster": new_cluster}
+
+    def trends(self, recent_buckets: int = 4, min_count: int = 5, min_growth: float = 2.0,
+               limit: int = 10, now: Optional[float] = None) -> Dict:
+        """
+        Clusters whose recent volume is rising against their own baseline.
+
+        The last `recent_buckets` buckets are compared with the average rate
+        over the older buckets in the window. Clusters younger than the
+        window are compared over the time they have existed, so a brand new
+        topic with a burst of volume shows up straight away.
+
+        Returns:
+            {"window", "trending": [...]} sorted by a Poisson z-score of the
+            recent count against the baseline expectation
+        """
+        now = time.time() if now is None else now
+        recent_buckets = max(1, min(recent_buckets, self.num_buckets - 1))
+        with self._lock:
+            if self._bucket is None:
+                return {"window": self._window(recent_buckets), "trending": []}
+            current = self._advance(now)
+            order = [(current - i) % self.num_buckets for i in range(self.num_buckets)]
+            ring = self._counts[:, order]  # Column 0 is the current bucket
+            recent = ring[:, :recent_buckets].sum(axis=1)
+            older = ring[:, recent_buckets:].sum(axis=1)
+
+            trending = []
+            for slot in np.flatnonzero(self._active & (recent >= min_count)):
+                meta = self._meta[slot]
+                age_buckets = current - int(meta["created"] // self.bucket_seconds) + 1
+                baseline_buckets = min(max(age_buckets - recent_buckets, 0), self.num_buckets - recent_buckets)
+                baseline_rate = older[slot] / baseline_buckets if baseline_buckets else 0.0
+                expected = baseline_rate * recent_buckets
+                growth = (recent[slot] + 1) / (expected + 1)
+                if growth < min_growth:
+                    continue
+                trending.append({
+                    "cluster_id": meta["id"],
+                    "recent_count": int(recent[slot]),
+                    "expected_count": round(float(expected), 2),
+                    "growth": round(float(growth), 2),
+                    "z_score": round(float((recent[slot] - expected) / np.sqrt(expected + 1)), 2),
+                    "total_count": int(self._totals[slot]),
+                    "new_topic": baseline_buckets == 0,
+                    "top_terms": [term for term, _ in meta["terms"].most_common(8)],
+                    "samples": list(meta["samples"]),
+                    "counts": [int(c) for c in ring[slot, :recent_buckets * 3][::-1]],
+                })
+            trending.sort(key=lambda t: t["z_score"], reverse=True)
+            return {"window": self._window(recent_buckets), "trending": trending[:limit]}
+
+    def _window(self, recent_buckets: int) -> Dict:
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "recent_buckets": recent_buckets,
+            "retained_buckets": self.num_buckets,
+        }
+
+    def snapshot(self) -> Dict:
+        return {"clusters": int(self._active.sum()), "max_clusters": self.max_clusters, **self.stats}
+
+
+_engine: Optional[TrendEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> TrendEngine:
+    """Process-wide trend engine (in memory; restarts begin a fresh window)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TrendEngine()
+    return _engine
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from app.utils.request_context import DeadlineExceeded
+
+# AIMD concurrency limits per endpoint. While the limit is in use it grows by
+# 1/limit per healthy request (about +1 per `limit` requests) and is cut by 10%
+# when a window's median latency climbs well above the endpoint's long-run
+# median, or when requests miss their deadline, so the service starts
+# shedding before its queues blow up.
+INITIAL_LIMIT = float(os.getenv("CONCURRENCY_INITIAL_LIMIT", "8"))
+MIN_LIMIT = float(os.getenv("CONCURRENCY_MIN_LIMIT", "1"))
+MAX_LIMIT = float(os.getenv("CONCURRENCY_MAX_LIMIT", "64"))
+LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+SAMPLE_WINDOW = int(os.getenv("CONCURRENCY_SAMPLE_WINDOW", "20"))
+BACKOFF_RATIO = 0.9
+LONG_WINDOW_ALPHA = 0.1  # Long-run median follows ~10 windows
+
+# What each endpoint returns when it sheds load: a cheaper answer or "reject" (503).
+# e.g. DEGRADE_MODES="reply:template,summarize:skip,classify:cache"
+DEGRADE_MODES: Dict[str, str] = {
+    "reply": "template",
+    "summarize": "extractive",
+    "classify": "cache",
+    "sentiment": "reject",
+    "embed": "reject",
+}
+for _pair in os.getenv("DEGRADE_MODES", "").split(","):
+    if ":" in _pair:
+        _endpoint, _, _mode = _pair.partition(":")
+        DEGRADE_MODES[_endpoint.strip()] = _mode.strip()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit with a short- vs long-window latency signal.
+
+    Latencies are collected in windows of SAMPLE_WINDOW requests. Each
+    window's median is compared with an EWMA of past window medians, and the
+    limit is only cut when the median has risen past LATENCY_TOLERANCE times
+    that long-run level while in-flight requests reached half the limit, i.e.
+    when latency rises together with concurrency. Single slow requests do not
+    move a median, and an idle endpoint's latency spread never triggers a cut.
+    The limit is cut at most once per window and otherwise grows by
+    1/limit per request released while at least half the limit is in use.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limit = INITIAL_LIMIT
+        self.inflight = 0
+        self._samples: List[float] = []
+        self._peak_inflight = 0
+        self._cut_in_window = False
+        self._congested = False
+        self._short = None
+        self._long = None
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "shed": 0, "backoffs": 0}
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                self.stats["shed"] += 1
+                return False
+            self.inflight += 1
+            self._peak_inflight = max(self._peak_inflight, self.inflight)
+            self.stats["admitted"] += 1
+            return True
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        with self._lock:
+            self.inflight -= 1
+            self._samples.append(latency)
+            if overloaded:
+                self._backoff()
+            elif not self._congested and not self._cut_in_window and self.inflight + 1 >= self.limit / 2:
+                # Only grow while the limit is actually being used
+                self.limit = min(MAX_LIMIT, self.limit + 1.0 / self.limit)
+            if len(self._samples) >= SAMPLE_WINDOW:
+                self._end_window()
+
+    def _backoff(self) -> None:
+        if not self._cut_in_window:
+            self.limit = max(MIN_LIMIT, self.limit * BACKOFF_RATIO)
+            self.stats["backoffs"] += 1
+            self._cut_in_window = True
+
+    def _end_window(self) -> None:
+        ordered = sorted(self._samples)
+        self._short = ordered[len(ordered) // 2]
+        if self._long is None:
+            self._long = self._short
+        self._congested = self._short > LATENCY_TOLERANCE * self._long \
+            and self._peak_inflight >= self.limit / 2
+        if self._congested:
+            self._backoff()
+        self._long += LONG_WINDOW_ALPHA * (self._short - self._long)
+        self._samples = []
+        self._peak_inflight = self.inflight
+        self._cut_in_window = False
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "short_median_ms": round(self._short * 1000, 1) if self._short is not None else None,
+            "long_median_ms": round(self._long * 1000, 1) if self._long is not None else None,
+            "degrade_mode": degrade_mode(self.name),
+            **self.stats,
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _registry_lock:
+            limiter = _limiters.setdefault(name, AdaptiveLimiter(name))
+    return limiter
+
+
+@contextmanager
+def admit(name: str) -> Iterator[bool]:
+    """
+    Admit a request to an endpoint, yielding False if it should be shed.
+
+    Endpoints whose requests differ in cost by orders of magnitude use one
+    limiter per class, named "endpoint:class" (e.g. "summarize:extractive").
+    Latency of admitted requests feeds the limiter; a missed deadline counts
+    as an overload signal.
+    """
+    limiter = get_limiter(name)
+    if not limiter.try_acquire():
+        yield False
+        return
+    start = time.monotonic()
+    overloaded = False
+    try:
+        yield True
+    except DeadlineExceeded:
+        overloaded = True
+        raise
+    finally:
+        limiter.release(time.monotonic() - start, overloaded)
+
+
+def degrade_mode(name: str) -> str:
+    """Degrade mode of the endpoint a limiter belongs to ("summarize:abstractive" -> summarize)"""
+    return DEGRADE_MODES.get(name.partition(":")[0], "reject")
+
+
+def stats() -> Dict[str, Dict]:
+    return {name: limiter.snapshot() for name, limiter in sorted(_limiters.items())}
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from app.utils.model_cache import MODEL_CACHE_DIR
+from app.utils.request_context import current
+
+logger = logging.getLogger(__name__)
+
+# Calibrated latency profile written by `python -m scripts.calibrate_decoding`.
+# Each strategy's latency is modelled as fixed_ms + per_token_ms * new_tokens.
+DECODING_PROFILE_PATH = os.getenv("DECODING_PROFILE_PATH") or os.path.join(
+    MODEL_CACHE_DIR, "decoding_profile.json"
+)
+
+# Decoding strategies per model, best quality first. `generate` holds the
+# kwargs passed to the pipeline; the token budget is applied separately.
+STRATEGIES: Dict[str, List[Dict]] = {
+    "summarizer": [
+        {"name": "beam4", "generate": {"num_beams": 4, "do_sample": False, "early_stopping": True}},
+        {"name": "beam2", "generate": {"num_beams": 2, "do_sample": False, "early_stopping": True}},
+        {"name": "greedy", "generate": {"num_beams": 1, "do_sample": False}},
+    ],
+    "reply_local": [
+        {"name": "sample", "generate": {"do_sample": True, "temperature": 0.7, "top_p": 0.9, "num_beams": 1}},
+        {"name": "beam2", "generate": {"do_sample": False, "num_beams": 2, "early_stopping": True}},
+        {"name": "greedy", "generate": {"do_sample": False, "num_beams": 1}},
+    ],
+}
+
+# Rough CPU defaults used until a calibrated profile exists
+DEFAULT_PROFILE: Dict[str, Dict[str, Dict[str, float]]] = {
+    "summarizer": {
+        "beam4": {"fixed_ms": 350.0, "per_token_ms": 28.0},
+        "beam2": {"fixed_ms": 300.0, "per_token_ms": 16.0},
+        "greedy": {"fixed_ms": 250.0, "per_token_ms": 9.0},
+    },
+    "reply_local": {
+        "sample": {"fixed_ms": 90.0, "per_token_ms": 12.0},
+        "beam2": {"fixed_ms": 90.0, "per_token_ms": 18.0},
+        "greedy": {"fixed_ms": 90.0, "per_token_ms": 10.0},
+    },
+}
+
+# Quality tiers map to a strategy index without needing a budget
+QUALITY_TIERS = {"best": 0, "balanced": 1, "fast": -1}
+
+MIN_NEW_TOKENS = 16
+# Prefer a faster strategy over cutting output below this share of max tokens
+MIN_OUTPUT_FRACTION = 0.5
+
+_profile: Optional[Dict] = None
+
+
+def load_profile() -> Dict:
+    """Calibrated profile merged over the defaults (cached after first read)"""
+    global _profile
+    if _profile is None:
+        profile = {model: dict(entries) for model, entries in DEFAULT_PROFILE.items()}
+        if os.path.isfile(DECODING_PROFILE_PATH):
+            try:
+                with open(DECODING_PROFILE_PATH, "r", encoding="utf-8") as f:
+                    for model, entries in json.load(f).items():
+                        profile.setdefault(model, {}).update(entries)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable decoding profile {DECODING_PROFILE_PATH}: {e}")
+        _profile = profile
+    return _profile
+
+
+def predict_ms(model: str, strategy: str, new_tokens: int) -> float:
+    entry = load_profile()[model][strategy]
+    return entry["fixed_ms"] + entry["per_token_ms"] * new_tokens
+
+
+def choose_strategy(
+    model: str,
+    max_new_tokens: int,
+    latency_budget_ms: Optional[float] = None,
+    quality: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Pick decoding parameters for a generation call.
+
+    With a quality tier, the tier's strategy is used at the requested length.
+    With a latency budget (or a request deadline), the highest-quality
+    strategy that can still produce at least MIN_OUTPUT_FRACTION of the
+    requested tokens within the budget is used, with max_new_tokens cut to
+    what fits; if none can, the fastest strategy is used at whatever length
+    fits (never below MIN_NEW_TOKENS). The budget is capped by the remaining
+    request deadline when one is set.
+
+    Returns:
+        {"strategy", "generate", "max_new_tokens", "predicted_ms"}, or None
+        when neither a budget, a tier nor a deadline applies (model defaults)
+    """
+    ctx = current()
+    remaining = ctx.remaining() if ctx is not None else None
+    if remaining is not None:
+        deadline_ms = remaining * 1000
+        latency_budget_ms = deadline_ms if latency_budget_ms is None else min(latency_budget_ms, deadline_ms)
+    if latency_budget_ms is None and quality is None:
+        return None
+
+    strategies = STRATEGIES[model]
+    if quality is not None and latency_budget_ms is None:
+        chosen = strategies[QUALITY_TIERS[quality]]
+        return _plan(model, chosen, max_new_tokens)
+
+    # A quality tier with a budget caps quality at that tier
+    start = QUALITY_TIERS.get(quality, 0) % len(strategies)
+    wanted = max(MIN_NEW_TOKENS, int(max_new_tokens * MIN_OUTPUT_FRACTION))
+    for chosen in strategies[start:]:
+        affordable = _affordable_tokens(model, chosen["name"], latency_budget_ms)
+        if affordable >= wanted:
+            return _plan(model, chosen, min(max_new_tokens, affordable))
+    fastest = strategies[-1]
+    affordable = _affordable_tokens(model, fastest["name"], latency_budget_ms)
+    return _plan(model, fastest, min(max_new_tokens, max(MIN_NEW_TOKENS, affordable)))
+
+
+def _affordable_tokens(model: str, strategy: str, latency_budget_ms: float) -> int:
+    entry = load_profile()[model][strategy]
+    return int((latency_budget_ms - entry["fixed_ms"]) / entry["per_token_ms"])
+
+
+def _plan(model: str, strategy: Dict, max_new_tokens: int) -> Dict:
+    return {
+        "strategy": strategy["name"],
+        "generate": dict(strategy["generate"]),
+        "max_new_tokens": max_new_tokens,
+        "predicted_ms": round(predict_ms(model, strategy["name"], max_new_tokens), 1),
+    }
+
+
+def describe(plan: Optional[Dict]) -> Dict:
+    """Decoding summary for API responses"""
+    if plan is None:
+        return {"strategy": "default"}
+    return {
+        "strategy": plan["strategy"],
+        "max_new_tokens": plan["max_new_tokens"],
+        "predicted_ms": plan["predicted_ms"],
+        **plan["generate"],
+    }
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from app.utils.request_context import (
+    DeadlineExceeded,
+    RequestCancelled,
+    RequestContext,
+    activate,
+)
+from app.utils.scheduling import FairQueue, resolve_priority
+
+logger = logging.getLogger(__name__)
+
+# Worker threads per model. Torch releases the GIL during forward passes, but
+# each extra worker holds its own activations, so keep this small on CPU.
+DEFAULT_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+
+
+class _WorkItem:
+    __slots__ = ("fn", "args", "kwargs", "ctx", "loop", "future", "enqueued")
+
+    def __init__(self, fn, args, kwargs, ctx, loop, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.ctx = ctx
+        self.loop = loop
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class ModelExecutor:
+    """
+    Bounded worker pool in front of one model.
+
+    Requests queue here instead of blocking the event loop, in a weighted fair
+    queue keyed by the request's priority class. Each item carries
+    its RequestContext, so work whose caller disconnected or whose deadline has
+    passed is dropped when it reaches the head of the queue rather than run.
+    Work that is predicted to start after its deadline is rejected on arrival.
+    """
+
+    def __init__(self, name: str, workers: int = DEFAULT_WORKERS):
+        self.name = name
+        self.workers = max(1, workers)
+        self._queue = FairQueue()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._busy = 0
+        self._service_time = None  # EWMA of run time in seconds
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected_on_arrival": 0,
+            "dropped_expired": 0,
+            "dropped_cancelled": 0,
+            "aborted_in_flight": 0,
+        }
+        # Recent queue waits per priority class, for p50/p95 reporting
+        self._waits = {name: deque(maxlen=512) for name in self._queue.weights}
+        self._served = {name: 0 for name in self._queue.weights}
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f"{self.name}-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def estimated_wait(self, priority: Optional[str] = None) -> float:
+        """Rough seconds until a newly queued item of `priority` would start running"""
+        if self._service_time is None:
+            return 0.0
+        queued = self._queue.ahead_of(priority) if priority else len(self._queue)
+        ahead = queued + max(0, self._busy - self.workers + 1)
+        return ahead * self._service_time / self.workers
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def run(self, ctx: RequestContext, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on this model's workers.
+
+        Raises:
+            DeadlineExceeded: Deadline passed before the work could finish
+            RequestCancelled: Client disconnected before the work finished
+        """
+        self._ensure_started()
+        self.stats["submitted"] += 1
+
+        priority = ctx.priority or resolve_priority()
+        remaining = ctx.remaining()
+        if ctx.done or (remaining is not None and self.estimated_wait(priority) > remaining):
+            self.stats["rejected_on_arrival"] += 1
+            ctx.check()
+            raise DeadlineExceeded(f"{self.name} queue wait exceeds request deadline")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Results delivered after the caller gave up are never awaited
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        with self._cond:
+            self._queue.append(_WorkItem(fn, args, kwargs, ctx, loop, future), priority)
+            self._cond.notify()
+
+        try:
+            # Stop waiting at the deadline; the worker drops or aborts the item
+            return await asyncio.wait_for(asyncio.shield(future), ctx.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{self.name} did not finish before request deadline")
+        except asyncio.CancelledError:
+            ctx.cancel()
+            raise
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                priority, item = self._queue.popleft()
+                self._waits[priority].append(time.monotonic() - item.enqueued)
+                self._served[priority] += 1
+                if item.ctx.done:
+                    key = "dropped_cancelled" if item.ctx.cancelled else "dropped_expired"
+                    self.stats[key] += 1
+                    self._deliver(item, exc=_stop_error(item.ctx))
+                    continue
+                self._busy += 1
+
+            start = time.monotonic()
+            try:
+                with activate(item.ctx):
+                    result = item.fn(*item.args, **item.kwargs)
+                item.ctx.check()
+            except RequestCancelled as e:
+                self.stats["aborted_in_flight"] += 1
+                self._deliver(item, exc=e)
+            except Exception as e:
+                self.stats["failed"] += 1
+                self._deliver(item, exc=e)
+            else:
+                self.stats["completed"] += 1
+                self._deliver(item, result=result)
+            finally:
+                elapsed = time.monotonic() - start
+                self._service_time = (
+                    elapsed if self._service_time is None
+                    else 0.8 * self._service_time + 0.2 * elapsed
+                )
+                with self._cond:
+                    self._busy -= 1
+
+    @staticmethod
+    def _deliver(item: _WorkItem, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        def _set():
+            if item.future.done():
+                return
+            if exc is not None:
+                item.future.set_exception(exc)
+            else:
+                item.future.set_result(result)
+
+        try:
+            item.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            pass  # Event loop closed during shutdown
+
+    def snapshot(self) -> Dict:
+        classes = {}
+        for name, waits in self._waits.items():
+            recent = np.fromiter(waits, dtype=float) * 1000 if waits else None
+            classes[name] = {
+                "weight": self._queue.weights[name],
+                "queue_depth": self._queue.depth(name),
+                "served": self._served[name],
+                "queue_ms_p50": round(float(np.percentile(recent, 50)), 1) if recent is not None else None,
+                "queue_ms_p95": round(float(np.percentile(recent, 95)), 1) if recent is not None else None,
+            }
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "busy": self._busy,
+            "avg_service_ms": round(self._service_time * 1000, 1) if self._service_time else None,
+            **self.stats,
+            "priority_classes": classes,
+        }
+
+
+def _stop_error(ctx: RequestContext) -> RequestCancelled:
+    if ctx.cancelled:
+        return RequestCancelled("Client disconnected before work started")
+    return DeadlineExceeded("Request deadline passed while queued")
+
+
+_executors: Dict[str, ModelExecutor] = {}
+_registry_lock = threading.Lock()
+
+
+def get_executor(name: str) -> ModelExecutor:
+    """Executor for a model, created on first use (INFERENCE_WORKERS_<NAME> overrides)"""
+    executor = _executors.get(name)
+    if executor is None:
+        with _registry_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                workers = int(os.getenv(f"INFERENCE_WORKERS_{name.upper()}", DEFAULT_WORKERS))
+                executor = ModelExecutor(name, workers)
+                _executors[name] = executor
+    return executor
+
+
+async def run(name: str, ctx: RequestContext, fn: Callable, *args, **kwargs) -> Any:
+    """Run `fn` on the named model's executor (see `ModelExecutor.run`)"""
+    return await get_executor(name).run(ctx, fn, *args, **kwargs)
+
+
+def stats() -> Dict[str, Dict]:
+    """Per-executor queue and load-shedding counters"""
+    return {name: executor.snapshot() for name, executor in sorted(_executors.items())}
@@ -0,0 +1,375 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from app.utils.request_context import RequestCancelled, RequestContext
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept for JOB_RETENTION_SECONDS, and at most JOB_MAX_FINISHED
+# of them; submissions are refused once JOB_MAX_PENDING jobs are waiting.
+# JOBS_DB_PATH enables SQLite persistence, so results survive a restart and
+# unfinished jobs are resumed at startup.
+RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "10000"))
+MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "")
+
+# Webhook delivery: comma list of allowed callback hosts. With an empty list,
+# only hosts that resolve to public addresses are accepted (no loopback,
+# private, link-local or cloud metadata targets).
+CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()}
+CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "5"))
+CALLBACK_ATTEMPTS = 3
+
+PENDING = ("queued", "running")
+
+Runner = Callable[[Dict, RequestContext], Awaitable[Dict]]
+_runners: Dict[str, Runner] = {}
+
+
+class JobRejected(Exception):
+    """Raised when a job cannot be accepted (queue full or bad callback URL)"""
+
+
+class InvalidCallback(JobRejected):
+    """Raised for a callback URL the service must not call"""
+
+
+def register_runner(kind: str, runner: Runner) -> None:
+    """Register the coroutine that executes jobs of a kind from their payload"""
+    _runners[kind] = runner
+
+
+def check_callback_url(url: str) -> None:
+    """
+    Reject callback URLs outside JOB_CALLBACK_HOSTS, or, with no allowlist,
+    any host that resolves to a non-public address. Resolves DNS, so call it
+    off the event loop.
+    """
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme not in ("http", "https") or not host:
+        raise InvalidCallback(f"Invalid callback URL: {url}")
+    if CALLBACK_HOSTS:
+        if host not in CALLBACK_HOSTS:
+            raise InvalidCallback(f"Callback host {host} is not in JOB_CALLBACK_HOSTS")
+        return
+    try:
+        addresses = {info[4][0].split("%")[0] for info in socket.getaddrinfo(host, parsed.port or None)}
+    except (socket.gaierror, ValueError):
+        raise InvalidCallback(f"Callback host {host} does not resolve")
+    if not all(ipaddress.ip_address(address).is_global for address in addresses):
+        raise InvalidCallback(
+            f"Callback host {host} resolves to a non-public address; add it to JOB_CALLBACK_HOSTS to allow it"
+        )
+
+
+class JobStore:
+    """
+    In-process job table with optional SQLite write-through.
+
+    Jobs are dicts mutated only on the event loop; the lock guards the SQLite
+    connection and the table against the odd call from a worker thread.
+    Identical pending submissions (same kind and payload) share one job, but
+    each submitter gets its own handle: the id it polls, cancels and receives
+    callbacks for. The first handle is the job id itself. Cancelling a handle
+    detaches that submitter; the work is only cancelled with the last one.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self._jobs: Dict[str, Dict] = {}
+        self._pending_by_key: Dict[str, str] = {}
+        self._handles: Dict[str, str] = {}  # handle id -> job id
+        self._contexts: Dict[str, RequestContext] = {}
+        self._tasks = set()  # Strong refs so running jobs are not garbage collected
+        self._lock = threading.RLock()
+        self._db = None
+        if db_path:
+            self._open(db_path)
+
+    # ------------------------------------------------------------ persistence
+
+    def _open(self, db_path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, dedup_key TEXT, finished_at REAL, data TEXT)"
+        )
+        for (data,) in self._db.execute("SELECT data FROM jobs"):
+            job = json.loads(data)
+            job.setdefault("handles", {job["id"]: {"cancelled": False}})
+            self._jobs[job["id"]] = job
+            for handle_id in job["handles"]:
+                self._handles[handle_id] = job["id"]
+            if job["status"] in PENDING:
+                self._pending_by_key[job["dedup_key"]] = job["id"]
+        logger.info(f"Loaded {len(self._jobs)} jobs from {db_path}")
+
+    def _persist(self, job: Dict) -> None:
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, dedup_key, finished_at, data) VALUES (?, ?, ?, ?)",
+                (job["id"], job["dedup_key"], job["finished_at"], json.dumps(job))
+            )
+
+    def _forget(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            for handle_id in self._jobs.pop(job_id)["handles"]:
+                self._handles.pop(handle_id, None)
+        if self._db is not None and job_ids:
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    # --------------------------------------------------------------- lifecycle
+
+    def submit(
+        self, kind: str, payload: Dict, priority: Optional[str] = None, callback_url: Optional[str] = None
+    ) -> Tuple[Dict, str, bool]:
+        """
+        Queue a job, or join an identical pending one with a new handle.
+
+        `callback_url` must already have passed check_callback_url (which
+        resolves DNS and so is left to the caller to run off the loop).
+
+        Returns:
+            (job, handle_id, deduplicated)
+        """
+        dedup_key = hashlib.sha256(
+            json.dumps([kind, payload], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+        with self._lock:
+            self._prune()
+            existing = self._jobs.get(self._pending_by_key.get(dedup_key, ""))
+            if existing is not None and existing["status"] in PENDING:
+                handle_id = uuid.uuid4().hex
+                existing["handles"][handle_id] = {"cancelled": False}
+                self._handles[handle_id] = existing["id"]
+                if callback_url:
+                    existing["callbacks"].append(_callback(callback_url, handle_id))
+                self._persist(existing)
+                return existing, handle_id, True
+            if len(self._pending_by_key) >= MAX_PENDING:
+                raise JobRejected(f"Job queue is full ({MAX_PENDING} pending)")
+
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "priority": priority,
+                "dedup_key": dedup_key,
+                "payload": payload,
+                "result": None,
+                "error": None,
+                "handles": {job_id: {"cancelled": False}},
+                "callbacks": [_callback(callback_url, job_id)] if callback_url else [],
+                "created_at": now,
+                "updated_at": now,
+                "finished_at": None,
+            }
+            self._jobs[job_id] = job
+            self._handles[job_id] = job_id
+            self._pending_by_key[dedup_key] = job_id
+            self._persist(job)
+        self._schedule(job)
+        return job, job_id, False
+
+    def resume(self) -> int:
+        """Re-run jobs left queued or running by a previous process"""
+        with self._lock:
+            pending = [job for job in self._jobs.values() if job["status"] in PENDING]
+            for job in pending:
+                self._update(job, status="queued")
+        for job in pending:
+            self._schedule(job)
+        return len(pending)
+
+    def cancel(self, handle_id: str) -> Optional[Dict]:
+        """
+        Cancel a submitter's handle on a pending job; None if unknown.
+
+        Other submitters sharing the job keep it running; the model work is
+        cancelled (and queued work dropped) only when no handle is left.
+        """
+        with self._lock:
+            job = self.get(handle_id)
+            if job is None:
+                return None
+            handle = job["handles"][handle_id]
+            if job["status"] not in PENDING or handle["cancelled"]:
+                return job
+            handle["cancelled"] = True
+            if any(not h["cancelled"] for h in job["handles"].values()):
+                # Detach: this submitter no longer gets a callback
+                job["callbacks"] = [c for c in job["callbacks"] if c.get("handle", job["id"]) != handle_id]
+                self._update(job)
+                return job
+            ctx = self._contexts.get(job["id"])
+            if ctx is not None:
+                ctx.cancel()
+            self._finish(job, status="cancelled", error="Cancelled by client")
+            return job
+
+    def get(self, handle_id: str) -> Optional[Dict]:
+        """The job behind a handle; None if unknown or past retention"""
+        job = self._jobs.get(self._handles.get(handle_id, ""))
+        if job is not None and job["finished_at"] is not None \
+                and job["finished_at"] < time.time() - RETENTION_SECONDS:
+            with self._lock:
+                self._prune()
+            return None
+        return job
+
+    def _schedule(self, job: Dict) -> None:
+        ctx = RequestContext(priority=job["priority"])
+        self._contexts[job["id"]] = ctx
+        task = asyncio.get_running_loop().create_task(self._execute(job, ctx))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: Dict, ctx: RequestContext) -> None:
+        try:
+            # A job cancelled before it started only needs its callbacks
+            if job["status"] == "queued":
+                self._update(job, status="running")
+                try:
+                    result = await _runners[job["kind"]](job["payload"], ctx)
+                except RequestCancelled:
+                    if job["status"] in PENDING:
+                        self._finish(job, status="cancelled", error="Cancelled")
+                except Exception as e:
+                    if job["status"] in PENDING:
+                        self._finish(job, status="failed", error=str(e))
+                else:
+                    if job["status"] in PENDING:
+                        self._finish(job, status="succeeded", result=result)
+            if job["callbacks"]:
+                await self._deliver(job)
+        finally:
+            self._contexts.pop(job["id"], None)
+
+    def _update(self, job: Dict, **fields) -> None:
+        with self._lock:
+            job.update(fields, updated_at=time.time())
+            self._persist(job)
+
+    def _finish(self, job: Dict, **fields) -> None:
+        with self._lock:
+            if self._pending_by_key.get(job["dedup_key"]) == job["id"]:
+                del self._pending_by_key[job["dedup_key"]]
+            self._update(job, finished_at=time.time(), **fields)
+
+    def _prune(self) -> None:
+        """Drop finished jobs past retention, then the oldest beyond MAX_FINISHED"""
+        cutoff = time.time() - RETENTION_SECONDS
+        finished = sorted(
+            (job for job in self._jobs.values() if job["finished_at"] is not None),
+            key=lambda job: job["finished_at"]
+        )
+        expired = [job["id"] for job in finished if job["finished_at"] < cutoff]
+        overflow = len(finished) - len(expired) - MAX_FINISHED
+        if overflow > 0:
+            expired += [job["id"] for job in finished[len(expired):len(expired) + overflow]]
+        self._forget(expired)
+
+    # ---------------------------------------------------------------- webhooks
+
+    async def _deliver(self, job: Dict) -> None:
+        for callback in job["callbacks"]:
+            if callback["status"] == "delivered":
+                continue
+            body = public_view(job, callback.get("handle"))
+            # Checked again at delivery: DNS may have changed since submission
+            try:
+                await asyncio.to_thread(check_callback_url, callback["url"])
+            except InvalidCallback as e:
+                callback.update(status="failed", error=str(e))
+                logger.warning(f"Job {job['id']} callback to {callback['url']} refused: {e}")
+                continue
+            for attempt in range(CALLBACK_ATTEMPTS):
+                callback["attempts"] += 1
+                try:
+                    # No redirects: a public host could bounce the POST to an internal one
+                    response = await asyncio.to_thread(
+                        requests.post, callback["url"], json=body, timeout=CALLBACK_TIMEOUT,
+                        allow_redirects=False
+                    )
+                    response.raise_for_status()
+                    callback.update(status="delivered", error=None)
+                    break
+                except requests.RequestException as e:
+                    callback.update(status="failed", error=str(e))
+                    if attempt + 1 < CALLBACK_ATTEMPTS:
+                        await asyncio.sleep(2 ** attempt)
+            if callback["status"] == "failed":
+                logger.warning(f"Job {job['id']} callback to {callback['url']} failed: {callback['error']}")
+        self._update(job)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._prune()
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "jobs": counts,
+            "pending": len(self._pending_by_key),
+            "max_pending": MAX_PENDING,
+            "retention_seconds": RETENTION_SECONDS,
+            "persistent": self._db is not None,
+        }
+
+
+def _callback(url: str, handle_id: str) -> Dict:
+    return {"url": url, "handle": handle_id, "status": "pending", "attempts": 0, "error": None}
+
+
+def public_view(job: Dict, handle_id: Optional[str] = None) -> Dict:
+    """Job as seen through one submitter's handle (no payload or dedup key)"""
+    handle_id = handle_id or job["id"]
+    cancelled = job["handles"].get(handle_id, {}).get("cancelled") and job["status"] != "cancelled"
+    return {
+        "job_id": handle_id,
+        "kind": job["kind"],
+        "status": "cancelled" if cancelled else job["status"],
+        "priority": job["priority"],
+        "result": None if cancelled else job["result"],
+        "error": "Cancelled by client" if cancelled else job["error"],
+        "callbacks": [
+            {"url": c["url"], "status": c["status"], "attempts": c["attempts"]}
+            for c in job["callbacks"] if c.get("handle", job["id"]) == handle_id
+        ],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    """Process-wide job store (SQLite-backed when JOBS_DB_PATH is set)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
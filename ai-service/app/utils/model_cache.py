@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Local snapshot directory written by `python -m scripts.snapshot_models`.
+# Each model lives in MODEL_CACHE_DIR/<name> as safetensors weights plus
+# tokenizer/config files, so loading is a local mmap with no hub lookups.
+# An empty value (e.g. `MODEL_CACHE_DIR=` in an env file) counts as unset.
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "model_cache"
+)
+
+# Hub ids of every model the service loads, keyed by snapshot name
+MODEL_SPECS = {
+    "classifier": {"task": "zero-shot-classification", "model_id": "facebook/bart-large-mnli"},
+    "sentiment": {"task": "sentiment-analysis", "model_id": "distilbert/distilbert-base-uncased-finetuned-sst-2-english"},
+    "summarizer": {"task": "summarization", "model_id": "facebook/bart-large-cnn"},
+    "reply_local": {"task": "text2text-generation", "model_id": "google/flan-t5-base"},
+    "embedder": {"task": "sentence-embedding", "model_id": "sentence-transformers/all-MiniLM-L6-v2"},
+}
+
+_PROCESS_START = time.monotonic()
+_report: Dict[str, Any] = {"models": {}}
+
+
+def snapshot_path(name: str) -> str:
+    return os.path.join(MODEL_CACHE_DIR, name)
+
+
+def has_snapshot(name: str) -> bool:
+    return os.path.isfile(os.path.join(snapshot_path(name), "config.json")) or \
+        os.path.isfile(os.path.join(snapshot_path(name), "modules.json"))
+
+
+def configure_offline() -> bool:
+    """
+    Disable hub lookups when running from local snapshots.
+
+    Must run before transformers / huggingface_hub are first imported, since
+    both read these variables at import time. Offline mode is forced with
+    AI_OFFLINE=1, and enabled automatically when every model has a snapshot.
+
+    Returns:
+        True if the process is running offline
+    """
+    forced = os.getenv("AI_OFFLINE", "").lower() in ("1", "true", "yes")
+    offline = forced or all(has_snapshot(name) for name in MODEL_SPECS)
+    if offline:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    _report["offline"] = offline
+    return offline
+
+
+def load_pipeline(name: str, **kwargs):
+    """
+    Build a transformers pipeline, preferring the local safetensors snapshot.
+
+    Snapshot weights are loaded with low_cpu_mem_usage so safetensors maps the
+    file instead of allocating and copying a second full set of weights.
+    """
+    from transformers import pipeline
+
+    spec = MODEL_SPECS[name]
+    if has_snapshot(name):
+        source = snapshot_path(name)
+        kwargs.setdefault("model_kwargs", {}).setdefault("low_cpu_mem_usage", True)
+    else:
+        source = spec["model_id"]
+    _report["models"].setdefault(name, {})["source"] = "snapshot" if source != spec["model_id"] else "hub"
+    return pipeline(spec["task"], model=source, tokenizer=source, **kwargs)
+
+
+def load_sentence_transformer(name: str):
+    """Load a SentenceTransformer, preferring the local snapshot"""
+    from sentence_transformers import SentenceTransformer
+
+    spec = MODEL_SPECS[name]
+    source = snapshot_path(name) if has_snapshot(name) else spec["model_id"]
+    _report["models"].setdefault(name, {})["source"] = "snapshot" if source != spec["model_id"] else "hub"
+    return SentenceTransformer(source)
+
+
+class LazyModel:
+    """
+    Load a model on first use instead of at import time.
+
+    Importing the API no longer pulls in torch/transformers or touches the
+    hub, so the service answers `/` immediately. The first request (or the
+    optional preload at startup) pays the load, guarded so concurrent
+    callers share one load.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is not None:
+            return self._value
+        with self._lock:
+            if self._value is None:
+                start = time.monotonic()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    _report["models"].setdefault(self.name, {})["error"] = str(e)
+                    logger.error(f"Failed to load {self.name} model: {e}")
+                    raise
+                elapsed = time.monotonic() - start
+                entry = _report["models"].setdefault(self.name, {})
+                entry["load_seconds"] = round(elapsed, 3)
+                entry["loaded_at_seconds"] = round(time.monotonic() - _PROCESS_START, 3)
+                logger.info(f"Loaded {self.name} model in {elapsed:.2f}s ({entry.get('source')})")
+        return self._value
+
+
+_registry: Dict[str, LazyModel] = {}
+
+
+def lazy_model(name: str, loader: Callable[[], Any]) -> LazyModel:
+    """Create and register a LazyModel so startup preload and reports can find it"""
+    model = LazyModel(name, loader)
+    _registry[name] = model
+    return model
+
+
+def preload(names) -> None:
+    """Load the named models (or "all"), logging failures instead of raising"""
+    if names == "all":
+        names = list(_registry)
+    for name in names:
+        model = _registry.get(name)
+        if model is None:
+            logger.warning(f"Unknown model in PRELOAD_MODELS: {name}")
+            continue
+        try:
+            model.get()
+        except Exception:
+            pass  # Already logged; the first request will retry
+
+
+def record(key: str, seconds: float) -> None:
+    """Record a startup milestone (seconds since process start)"""
+    _report[key] = round(seconds, 3)
+
+
+def process_uptime() -> float:
+    return time.monotonic() - _PROCESS_START
+
+
+def report() -> Dict[str, Any]:
+    """Import, snapshot and per-model load timings for the startup report"""
+    models = {}
+    for name in MODEL_SPECS:
+        entry = dict(_report["models"].get(name, {}))
+        entry["loaded"] = name in _registry and _registry[name].loaded
+        entry["snapshot"] = has_snapshot(name)
+        models[name] = entry
+    return {
+        **{k: v for k, v in _report.items() if k != "models"},
+        "model_cache_dir": MODEL_CACHE_DIR,
+        "uptime_seconds": round(process_uptime(), 3),
+        "models": models,
+    }
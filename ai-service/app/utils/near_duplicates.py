@@ -0,0 +1,269 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.request_context import RequestContext
+from app.utils.text_processing import clean_complaint_text, tokenize_text
+
+# Near-duplicate detection at intake: texts whose estimated Jaccard similarity
+# (word shingles over clean_complaint_text + tokenize_text) to a recent
+# cluster representative is at least NEAR_DUP_THRESHOLD reuse that cluster's
+# model results. Clusters expire NEAR_DUP_WINDOW_SECONDS after their last hit.
+ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") not in ("0", "false", "no")
+THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+WINDOW_SECONDS = float(os.getenv("NEAR_DUP_WINDOW_SECONDS", "900"))
+MAX_CLUSTERS = int(os.getenv("NEAR_DUP_MAX_CLUSTERS", "5000"))
+SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "3"))
+MIN_TOKENS = 5  # Shorter texts are too ambiguous to treat as duplicates
+WAIT_POLL_SECONDS = 0.05  # How often a waiter checks for its own disconnect
+MAX_RESULT_KEYS = 8  # Results kept per cluster (keys include client-chosen labels)
+# Result fields any request may carry regardless of the endpoint's shared fields
+COMMON_FIELDS = frozenset({"degraded", "degraded_mode"})
+
+# 128 permutations in 16 bands of 8 rows: pairs at Jaccard 0.8 share a band
+# with probability ~0.9, pairs at 0.5 with ~0.06; candidates are then
+# verified against THRESHOLD on the full signature.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = np.uint64((1 << 31) - 1)  # a * crc32 stays below 2**63
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 31) - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+
+
+def normalize(text: str) -> List[str]:
+    return tokenize_text(clean_complaint_text(text))
+
+
+def shingles(tokens: List[str], size: int = SHINGLE_SIZE) -> List[str]:
+    """Word shingles of normalized tokens (single words for short texts)"""
+    if len(tokens) < size:
+        return tokens
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def minhash(items: List[str]) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of a set of shingles"""
+    unique = set(items)
+    hashes = np.fromiter((zlib.crc32(item.encode("utf-8")) for item in unique), dtype=np.uint64, count=len(unique))
+    return ((_A * hashes[None, :] + _B) % _PRIME).min(axis=1)
+
+
+class Cluster:
+    """A representative text's signature plus the results computed for it"""
+
+    def __init__(self, signature: np.ndarray):
+        self.id = uuid.uuid4().hex[:12]
+        self.signature = signature
+        self.size = 1
+        self.last_seen = time.monotonic()
+        self.results: Dict[Hashable, Dict] = {}
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+
+
+class Match:
+    """Outcome of a lookup: the cluster a text belongs to and how similar it is"""
+
+    def __init__(self, cluster: Cluster, similarity: float, duplicate: bool):
+        self.cluster = cluster
+        self.similarity = similarity
+        self.duplicate = duplicate
+
+    async def run(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Dict]],
+        fields: Iterable[str],
+        ctx: Optional[RequestContext] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        Return the cluster's result for `key`, computing it at most once.
+
+        Only results made up entirely of `fields` are shared: those must be
+        outputs that do not quote the input (labels and scores), since a near
+        duplicate is a different customer's text. Any other result (e.g.
+        long-mode sentiment segments with offsets into its own text) is
+        returned to its own request only, and waiters compute their own.
+
+        Concurrent requests in the same cluster wait for the one in flight
+        instead of running the model again, but only within their own
+        deadline and until they disconnect. Degraded results are passed to
+        waiters but not kept for later hits.
+
+        Returns:
+            (result, reused)
+
+        Raises:
+            DeadlineExceeded / RequestCancelled: `ctx` ran out of time or was
+                cancelled while waiting
+        """
+        cluster = self.cluster
+        if key in cluster.results:
+            return dict(cluster.results[key]), True
+        pending = cluster.pending.get(key)
+        if pending is not None:
+            await _wait(pending, ctx)
+            try:
+                shared = pending.result()
+            except Exception:
+                shared = None  # The first attempt failed; try with this request
+            if shared is not None:
+                return dict(shared), True
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # Mark retrieved
+        cluster.pending[key] = future
+        try:
+            result = await compute()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Cancelled"))
+            raise
+        finally:
+            if cluster.pending.get(key) is future:
+                del cluster.pending[key]
+        allowed = COMMON_FIELDS.union(fields)
+        shared = result if all(name in allowed for name in result) else None
+        if shared is not None and not result.get("degraded"):
+            if key not in cluster.results and len(cluster.results) >= MAX_RESULT_KEYS:
+                del cluster.results[next(iter(cluster.results))]  # Oldest key
+            cluster.results[key] = shared
+        future.set_result(shared)  # None: waiters run their own request
+        return result, False
+
+    def describe(self, reused: bool) -> Dict[str, Any]:
+        return {
+            "cluster_id": self.cluster.id,
+            "similarity": round(self.similarity, 3),
+            "cluster_size": self.cluster.size,
+            "reused": reused,
+        }
+
+
+async def _wait(future: asyncio.Future, ctx: Optional[RequestContext]) -> None:
+    """Wait for another request's result without outliving this request"""
+    if ctx is None:
+        await asyncio.wait({future})
+        return
+    while not future.done():
+        ctx.check()
+        remaining = ctx.remaining()
+        timeout = WAIT_POLL_SECONDS if remaining is None else max(0.0, min(WAIT_POLL_SECONDS, remaining))
+        await asyncio.wait({future}, timeout=timeout)
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash LSH index of recent cluster representatives.
+
+    Only representatives are indexed; a matching text joins the cluster and
+    refreshes its window. Clusters sit in a deque by last refresh, so expiry
+    pops from the left and re-appends clusters that were hit since.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, window_seconds: float = WINDOW_SECONDS,
+                 max_clusters: int = MAX_CLUSTERS):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.max_clusters = max_clusters
+        self._buckets: List[Dict[bytes, List[Cluster]]] = [{} for _ in range(BANDS)]
+        self._order: deque = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "duplicates": 0, "clusters_created": 0, "clusters_expired": 0}
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+    def _expire(self, now: float) -> None:
+        while self._order:
+            cluster, refreshed = self._order[0]
+            # Below max_clusters, so the cluster a lookup may add still fits
+            if now - refreshed < self.window_seconds and self._size < self.max_clusters:
+                break
+            self._order.popleft()
+            if cluster.last_seen > refreshed and now - cluster.last_seen < self.window_seconds \
+                    and self._size < self.max_clusters:
+                self._order.append((cluster, cluster.last_seen))  # Hit since queued; keep
+                continue
+            for band, key in zip(self._buckets, self._band_keys(cluster.signature)):
+                members = band.get(key)
+                if members is not None:
+                    members.remove(cluster)
+                    if not members:
+                        del band[key]
+            self._size -= 1
+            self.stats["clusters_expired"] += 1
+
+    def match(self, text: str) -> Optional[Match]:
+        """Find or create the cluster for a text; None if it is too short to match"""
+        tokens = normalize(text)
+        if len(tokens) < MIN_TOKENS:
+            return None
+        signature = minhash(shingles(tokens))
+        keys = self._band_keys(signature)
+        now = time.monotonic()
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            self._expire(now)
+            best, best_similarity = None, 0.0
+            seen = set()
+            for band, key in zip(self._buckets, keys):
+                for candidate in band.get(key, ()):
+                    if id(candidate) in seen:
+                        continue
+                    seen.add(id(candidate))
+                    similarity = float(np.mean(candidate.signature == signature))
+                    if similarity > best_similarity:
+                        best, best_similarity = candidate, similarity
+
+            if best is not None and best_similarity >= self.threshold:
+                best.size += 1
+                best.last_seen = now
+                self.stats["duplicates"] += 1
+                return Match(best, best_similarity, True)
+
+            cluster = Cluster(signature)
+            for band, key in zip(self._buckets, keys):
+                band.setdefault(key, []).append(cluster)
+            self._order.append((cluster, now))
+            self._size += 1
+            self.stats["clusters_created"] += 1
+            return Match(cluster, 1.0, False)
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": ENABLED,
+            "clusters": self._size,
+            "threshold": self.threshold,
+            "window_seconds": self.window_seconds,
+            **self.stats,
+        }
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex()
+    return _index
+
+
+def match(text: str) -> Optional[Match]:
+    """Cluster lookup for an incoming text (None when disabled or too short)"""
+    if not ENABLED:
+        return None
+    return get_index().match(text)
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Header carrying the caller's remaining time budget in milliseconds.
+# The Node backend sets this from its own axios timeout minus time already spent.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+
+class RequestCancelled(Exception):
+    """Raised when the caller has gone away and its work should stop"""
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Raised when work cannot finish (or start) before the caller's deadline"""
+
+
+class RequestContext:
+    """
+    Per-request deadline and cancellation state.
+
+    Shared between the event loop (which cancels on client disconnect) and the
+    inference worker threads (which check it before and during model calls),
+    so cancellation is a thread-safe Event rather than an asyncio primitive.
+    """
+
+    def __init__(self, timeout_ms: Optional[float] = None, priority: Optional[str] = None):
+        self.created = time.monotonic()
+        self.priority = priority
+        self.deadline = self.created + timeout_ms / 1000.0 if timeout_ms else None
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_header(cls, value: Optional[str], priority: Optional[str] = None) -> "RequestContext":
+        """Build a context from the deadline header, ignoring malformed values"""
+        try:
+            timeout_ms = float(value) if value else None
+        except ValueError:
+            timeout_ms = None
+        if timeout_ms is not None and timeout_ms <= 0:
+            timeout_ms = 0.001  # Already out of time; fail fast
+        return cls(timeout_ms, priority)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if unbounded"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        """True when the result is no longer wanted"""
+        return self.cancelled or self.expired
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check(self) -> None:
+        """Raise if the work should stop now"""
+        if self.cancelled:
+            raise RequestCancelled("Client disconnected")
+        if self.expired:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+    def timeout(self, default: float) -> float:
+        """Clamp a network timeout (seconds) to the remaining budget"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(0.001, min(default, remaining))
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current() -> Optional[RequestContext]:
+    """Context of the request being served on this thread, if any"""
+    return _current.get()
+
+
+@contextmanager
+def activate(ctx: Optional[RequestContext]) -> Iterator[None]:
+    """Make `ctx` the current context for model code running in this block"""
+    token = _current.set(ctx)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def check_cancelled() -> None:
+    """Raise if the current request was cancelled or ran out of time"""
+    ctx = current()
+    if ctx is not None:
+        ctx.check()
+
+
+def network_timeout(default: float) -> float:
+    """Network timeout for outbound API calls, bounded by the current deadline"""
+    ctx = current()
+    return ctx.timeout(default) if ctx is not None else default
+
+
+async def watch_disconnect(request, ctx: RequestContext, interval: float = 0.1) -> None:
+    """Poll a Starlette request and cancel `ctx` once the client disconnects"""
+    while not ctx.done:
+        if await request.is_disconnected():
+            ctx.cancel()
+            return
+        await asyncio.sleep(interval)
+
+
+def stopping_criteria():
+    """
+    Build a transformers StoppingCriteriaList that ends generation as soon as
+    the current request is cancelled or past its deadline.
+
+    Checked by `generate()` after every decoding step, so beam search and
+    sampling loops stop between tokens instead of running to max_length.
+    Callers must still call `check_cancelled()` afterwards to discard the
+    truncated output. Returns None outside a request.
+    """
+    ctx = current()
+    if ctx is None:
+        return None
+
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _CancelCriteria(StoppingCriteria):
+        # A plain bool works with every supported transformers version:
+        # before 4.39 the list does any() over the criteria (a per-sequence
+        # tensor is ambiguous there under beam search), from 4.39 it ORs the
+        # result into a per-sequence tensor, which broadcasts a bool.
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return ctx.done
+
+    return StoppingCriteriaList([_CancelCriteria()])
@@ -0,0 +1,119 @@
+import os
+from collections import deque
+from typing import Dict, Optional
+
+# Request priority classes and their weighted-fair-queuing weights.
+# When every class is backlogged each gets capacity in proportion to its
+# weight (16:4:1 leaves bulk 1/21 under contention), so interactive traffic
+# keeps a guaranteed share; a class takes over capacity the others leave idle.
+# Override with PRIORITY_WEIGHTS="interactive:16,standard:4,bulk:1".
+PRIORITY_HEADER = "X-Priority"
+API_KEY_HEADER = "X-API-Key"
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for part in value.split(","):
+        if ":" in part:
+            key, _, val = part.partition(":")
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+
+PRIORITY_WEIGHTS: Dict[str, float] = {
+    name: float(weight)
+    for name, weight in _parse_pairs(
+        os.getenv("PRIORITY_WEIGHTS", "interactive:16,standard:4,bulk:1")
+    ).items()
+}
+DEFAULT_PRIORITY = os.getenv("DEFAULT_PRIORITY", "standard")
+
+# Map API keys to classes so batch clients are demoted without code changes,
+# e.g. PRIORITY_API_KEYS="backfill-key:bulk,chat-ui-key:interactive"
+PRIORITY_API_KEYS: Dict[str, str] = _parse_pairs(os.getenv("PRIORITY_API_KEYS", ""))
+
+
+def resolve_priority(header: Optional[str] = None, api_key: Optional[str] = None) -> str:
+    """
+    Pick the priority class for a request.
+
+    A class mapped to the caller's API key wins. Otherwise the header may
+    only demote: classes weighted above DEFAULT_PRIORITY (e.g. interactive)
+    are reserved for mapped keys, so an unauthenticated caller cannot take
+    the interactive share. Unknown values fall back to DEFAULT_PRIORITY.
+    """
+    if api_key and PRIORITY_API_KEYS.get(api_key) in PRIORITY_WEIGHTS:
+        return PRIORITY_API_KEYS[api_key]
+    default = DEFAULT_PRIORITY if DEFAULT_PRIORITY in PRIORITY_WEIGHTS else next(iter(PRIORITY_WEIGHTS))
+    requested = header.strip().lower() if header else None
+    if requested in PRIORITY_WEIGHTS and PRIORITY_WEIGHTS[requested] <= PRIORITY_WEIGHTS[default]:
+        return requested
+    return default
+
+
+class FairQueue:
+    """
+    Weighted fair queue over priority classes (self-clocked fair queuing).
+
+    Each item is stamped with a virtual finish tag of
+    max(virtual_time, last tag of its class) + 1 / weight, and `popleft`
+    serves the smallest finish tag; virtual time is the tag of the item last
+    served. Every backlogged class keeps its weighted share, so bulk is
+    slowed but never starved. Idle classes do not bank credit, so a bulk
+    backlog cannot starve a burst of interactive requests arriving later.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(weights or PRIORITY_WEIGHTS)
+        self._queues = {name: deque() for name in self.weights}
+        self._last_tag = {name: 0.0 for name in self.weights}
+        self._virtual_time = 0.0
+        self._size = 0
+
+    def append(self, item, priority: str) -> None:
+        if priority not in self._queues:
+            priority = DEFAULT_PRIORITY if DEFAULT_PRIORITY in self._queues else next(iter(self._queues))
+        tag = max(self._virtual_time, self._last_tag[priority]) + 1.0 / self.weights[priority]
+        self._last_tag[priority] = tag
+        self._queues[priority].append((tag, item))
+        self._size += 1
+
+    def popleft(self):
+        """Remove and return (priority, item) with the smallest finish tag"""
+        best = None
+        for name, queue in self._queues.items():
+            if queue and (best is None or queue[0][0] < self._queues[best][0][0]):
+                best = name
+        if best is None:
+            raise IndexError("pop from an empty FairQueue")
+        tag, item = self._queues[best].popleft()
+        self._virtual_time = tag
+        self._size -= 1
+        return best, item
+
+    def depth(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return self._size
+        return len(self._queues.get(priority, ()))
+
+    def ahead_of(self, priority: str) -> float:
+        """
+        Expected number of items served before a new arrival of `priority`.
+
+        Its own class is served in full; other classes interleave in
+        proportion to their weight relative to this class.
+        """
+        weight = self.weights.get(priority, 1.0)
+        rounds = len(self._queues.get(priority, ())) + 1
+        ahead = rounds - 1.0
+        for name, queue in self._queues.items():
+            if name != priority:
+                ahead += min(len(queue), rounds * self.weights[name] / weight)
+        return ahead
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
@@ -0,0 +1,170 @@
+import base64
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary format
+    msgpack = None
+
+# Media types understood by the embedding endpoint
+MEDIA_JSON = "application/json"
+MEDIA_FLOAT32 = "application/x-float32"
+MEDIA_FLOAT16 = "application/x-float16"
+MEDIA_OCTET = "application/octet-stream"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_X_MSGPACK = "application/x-msgpack"
+
+DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed.
+
+    orjson is several times faster than the stdlib encoder and serializes
+    NumPy arrays natively, so handlers can return arrays without calling
+    `.tolist()` first. Falls back to the stdlib encoder otherwise.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(
+                content,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_default
+        ).encode("utf-8")
+
+
+def _default(obj: Any) -> Any:
+    """Stdlib fallback for NumPy values"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def vector_bytes(vector: np.ndarray, dtype: str = "float32") -> bytes:
+    """Pack a vector as raw little-endian bytes of the requested dtype"""
+    return np.ascontiguousarray(vector, dtype=DTYPES[dtype]).tobytes()
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Pick the response media type for a vector payload from an Accept header.
+
+    Honours q-values; unknown or wildcard types resolve to JSON so existing
+    clients keep working unchanged.
+    """
+    if not accept:
+        return MEDIA_JSON
+
+    supported = {
+        MEDIA_JSON, MEDIA_FLOAT32, MEDIA_FLOAT16,
+        MEDIA_OCTET, MEDIA_MSGPACK, MEDIA_X_MSGPACK
+    }
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        fields = [f.strip() for f in part.split(";")]
+        media = fields[0].lower()
+        quality = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media in supported and quality > 0:
+            candidates.append((-quality, position, media))
+
+    if not candidates:
+        return MEDIA_JSON
+    media = min(candidates)[2]
+    if media in (MEDIA_MSGPACK, MEDIA_X_MSGPACK) and msgpack is None:
+        return MEDIA_JSON
+    return media
+
+
+def vector_response(
+    vector: np.ndarray,
+    media_type: str,
+    encoding: str = "float",
+    dtype: str = "float32",
+    extra: Optional[Dict[str, Any]] = None
+) -> Response:
+    """
+    Build the response for a single embedding vector.
+
+    Args:
+        vector: 1-D embedding array
+        media_type: Negotiated media type (see `negotiate_media_type`)
+        encoding: For JSON responses, "float" (list of numbers) or "base64"
+        dtype: "float32" or "float16" for binary and base64 encodings
+        extra: Additional fields merged into JSON/MessagePack bodies
+
+    Returns:
+        Response with raw bytes, MessagePack, or JSON content
+    """
+    dimensions = int(vector.shape[-1])
+    extra = extra or {}
+
+    if media_type in (MEDIA_FLOAT32, MEDIA_FLOAT16, MEDIA_OCTET):
+        if media_type == MEDIA_FLOAT16:
+            dtype = "float16"
+        elif media_type == MEDIA_FLOAT32:
+            dtype = "float32"
+        return Response(
+            content=vector_bytes(vector, dtype),
+            media_type=media_type,
+            headers={
+                "X-Embedding-Dtype": dtype,
+                "X-Embedding-Dimensions": str(dimensions),
+                "X-Embedding-Byte-Order": "little"
+            }
+        )
+
+    if media_type in (MEDIA_MSGPACK, MEDIA_X_MSGPACK):
+        body = {
+            "embedding": vector_bytes(vector, dtype),
+            "dtype": dtype,
+            "dimensions": dimensions,
+            **extra
+        }
+        return Response(
+            content=msgpack.packb(body, use_bin_type=True),
+            media_type=media_type
+        )
+
+    if encoding == "base64":
+        body = {
+            "embedding": base64.b64encode(vector_bytes(vector, dtype)).decode("ascii"),
+            "encoding": "base64",
+            "dtype": dtype,
+            "dimensions": dimensions,
+            **extra
+        }
+    else:
+        body = {
+            "embedding": np.asarray(vector, dtype=np.float32),
+            "dimensions": dimensions,
+            **extra
+        }
+    return FastJSONResponse(content=body)
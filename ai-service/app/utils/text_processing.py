@@ -122,3 +122,26 @@ def validate_complaint_text(text: str) -> Dict[str, Any]:
         'word_count': len(tokens),
         'char_count': len(text)
     }
+
+# PII patterns for scrub_pii, applied in this order (cards and IPs before
+# phones so long digit runs are not all tagged as phone numbers)
+PII_PATTERNS = {
+    'email': (re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'), '[EMAIL]'),
+    'url': (re.compile(r'https?://\S+|www\.\S+', re.IGNORECASE), '[URL]'),
+    'card': (re.compile(r'\b(?:\d[ -]?){12,18}\d\b'), '[CARD]'),
+    'ip': (re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b'), '[IP]'),
+    'phone': (re.compile(r'(?<![\w])\+?\d[\d\s().-]{7,}\d\b'), '[PHONE]'),
+}
+
+def scrub_pii(text: str, kinds: List[str] = None) -> str:
+    """
+    Replace personal data with placeholders like [EMAIL] or [PHONE].
+    
+    Args:
+        text: Text to scrub
+        kinds: Subset of PII_PATTERNS keys to scrub (default: all)
+    """
+    for kind, (pattern, placeholder) in PII_PATTERNS.items():
+        if kinds is None or kind in kinds:
+            text = pattern.sub(placeholder, text)
+    return text
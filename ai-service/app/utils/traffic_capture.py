@@ -0,0 +1,178 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.utils.text_processing import PII_PATTERNS, scrub_pii
+
+logger = logging.getLogger(__name__)
+
+# Opt-in traffic capture for replay load tests (python -m scripts.replay_traffic).
+# Records are gzip-compressed JSON lines with short keys:
+#   t: arrival time (epoch s)   p: path   b: scrubbed body
+#   h: replayed headers (priority, deadline)   s: status   ms: latency
+CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "")
+CAPTURE_SAMPLE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0"))
+CAPTURE_ENDPOINTS = [
+    p.strip() for p in os.getenv("TRAFFIC_CAPTURE_ENDPOINTS", "/classify,/sentiment,/summarize,/reply").split(",")
+    if p.strip()
+]
+# PII kinds to scrub from every string in the body: "all", "none" or a comma
+# list of text_processing.PII_PATTERNS keys (email,url,card,ip,phone)
+CAPTURE_SCRUB = os.getenv("TRAFFIC_CAPTURE_SCRUB", "all")
+CAPTURE_HEADERS = ("x-priority", "x-request-timeout-ms")
+MAX_BODY_BYTES = 256 * 1024
+QUEUE_SIZE = 10000
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+_captures: List["TrafficCapture"] = []  # Live middleware instances
+
+
+def _scrub_kinds() -> Optional[List[str]]:
+    if CAPTURE_SCRUB == "all":
+        return None
+    if CAPTURE_SCRUB == "none":
+        return []
+    kinds = [k.strip() for k in CAPTURE_SCRUB.split(",") if k.strip()]
+    unknown = set(kinds) - set(PII_PATTERNS)
+    if unknown:
+        raise ValueError(f"Unknown TRAFFIC_CAPTURE_SCRUB kinds: {sorted(unknown)}")
+    return kinds
+
+
+def scrub_body(value: Any, kinds: Optional[List[str]]) -> Any:
+    """Scrub PII from every string in a decoded JSON body"""
+    if isinstance(value, str):
+        return scrub_pii(value, kinds) if kinds != [] else value
+    if isinstance(value, list):
+        return [scrub_body(v, kinds) for v in value]
+    if isinstance(value, dict):
+        return {k: scrub_body(v, kinds) for k, v in value.items()}
+    return value
+
+
+class TrafficCapture:
+    """
+    ASGI middleware that logs captured requests for later replay.
+
+    The request body is teed from `receive` and the status from `send`, so
+    responses are passed through untouched. Raw bodies go through a bounded
+    queue to a writer thread, which decodes and scrubs them off the event
+    loop; when the writer falls behind, records are dropped (and counted)
+    rather than slowing requests down.
+    """
+
+    def __init__(self, app, path: str = CAPTURE_PATH):
+        self.app = app
+        self.path = path
+        self.kinds = _scrub_kinds()
+        self.stats = {"captured": 0, "dropped": 0, "skipped": 0}
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._closed = False
+        self._writer = threading.Thread(target=self._write, name="traffic-capture", daemon=True)
+        self._writer.start()
+        _captures.append(self)
+        logger.info(f"Capturing {CAPTURE_ENDPOINTS} to {path} (scrub: {CAPTURE_SCRUB})")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or scope["method"] != "POST"
+            or scope["path"] not in CAPTURE_ENDPOINTS or random.random() >= CAPTURE_SAMPLE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.monotonic()
+        arrived_at = time.time()
+        chunks: List[bytes] = []
+        status = {"code": None}
+
+        async def tee_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def tee_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, tee_receive, tee_send)
+        finally:
+            self._record(scope, b"".join(chunks), status["code"], arrived, arrived_at)
+
+    def _record(self, scope, body: bytes, status: Optional[int], arrived: float, arrived_at: float) -> None:
+        if len(body) > MAX_BODY_BYTES:
+            self.stats["skipped"] += 1
+            return
+        if self._closed:
+            return
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+            if name.decode("latin-1").lower() in CAPTURE_HEADERS
+        }
+        record = {
+            "t": round(arrived_at, 4),
+            "p": scope["path"],
+            "h": headers,
+            "b": body,  # Decoded and scrubbed by the writer thread
+            "s": status,
+            "ms": round((time.monotonic() - arrived) * 1000, 1),
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Appending adds a new gzip member per process; readers handle that
+        with gzip.open(self.path, "at", encoding="utf-8", compresslevel=6) as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return  # Closing: leaving the block ends the gzip member cleanly
+                try:
+                    record["b"] = scrub_body(json.loads(record["b"]), self.kinds) if record["b"] else None
+                except ValueError:
+                    self.stats["skipped"] += 1
+                    record = None  # Not JSON; nothing a replay could send meaningfully
+                if record is not None:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                    self.stats["captured"] += 1
+                if self._queue.empty():
+                    f.flush()  # Sync flush: the file is readable up to here
+
+    def close(self) -> None:
+        """Write out queued records and close the gzip stream (blocks briefly)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=CLOSE_TIMEOUT_SECONDS)
+        except queue.Full:
+            logger.warning("Traffic capture writer is stuck; the capture tail may be truncated")
+            return
+        self._writer.join(CLOSE_TIMEOUT_SECONDS)
+
+    def snapshot(self) -> Dict:
+        return {"path": self.path, "queued": self._queue.qsize(), **self.stats}
+
+
+def stats() -> Optional[Dict]:
+    """Counters of the active capture (None when capture is off)"""
+    return _captures[-1].snapshot() if _captures else None
+
+
+def close() -> None:
+    """Flush and close every capture log; called at shutdown"""
+    for capture in _captures:
+        capture.close()
@@ -0,0 +1,72 @@
+"""
+Benchmark embedding payload size and encode time per response format.
+
+Uses random 384-dimension vectors (the all-MiniLM-L6-v2 output size), so no
+model download is needed. Run from the ai-service directory:
+
+    python -m scripts.bench_serialization --vectors 1000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.utils import serialization
+
+DIMENSIONS = 384
+
+
+def _time_encoder(encode, vectors, repeat):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = sum(len(encode(v)) for v in vectors)
+        best = min(best, time.perf_counter() - start)
+    return size / len(vectors), best / len(vectors) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def render(media_type, encoding="float", dtype="float32"):
+        return lambda v: serialization.vector_response(
+            v, media_type, encoding=encoding, dtype=dtype
+        ).body
+
+    encoders = {
+        "json (stdlib, tolist)": lambda v: json.dumps(
+            {"embedding": v.tolist(), "dimensions": len(v)}
+        ).encode("utf-8"),
+        "json (FastJSONResponse)": render(serialization.MEDIA_JSON),
+        "json base64 float32": render(serialization.MEDIA_JSON, "base64"),
+        "json base64 float16": render(serialization.MEDIA_JSON, "base64", "float16"),
+        "raw float32": render(serialization.MEDIA_FLOAT32),
+        "raw float16": render(serialization.MEDIA_FLOAT16),
+    }
+    if serialization.msgpack is not None:
+        encoders["msgpack float32"] = render(serialization.MEDIA_MSGPACK)
+
+    results = {
+        name: _time_encoder(encode, vectors, args.repeat)
+        for name, encode in encoders.items()
+    }
+    baseline_size, baseline_micros = results["json (stdlib, tolist)"]
+    print(f"{'format':<26}{'bytes/vec':>11}{'size':>8}{'us/vec':>10}{'speedup':>9}")
+    for name, (size, micros) in results.items():
+        print(
+            f"{name:<26}{size:>11.0f}{size / baseline_size:>8.0%}"
+            f"{micros:>10.1f}{baseline_micros / micros:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
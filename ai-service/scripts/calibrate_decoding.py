@@ -0,0 +1,81 @@
+"""
+Calibrate the decoding latency profile on this hardware.
+
+Times every decoding strategy in app/utils/decoding.py at two output lengths,
+fits latency = fixed_ms + per_token_ms * new_tokens, and writes the result to
+DECODING_PROFILE_PATH, which the service reads to pick strategies for
+latency_budget_ms requests. Run from the ai-service directory after the
+models are available (ideally snapshotted):
+
+    python -m scripts.calibrate_decoding
+    python -m scripts.calibrate_decoding summarizer
+"""
+import json
+import os
+import sys
+import time
+
+from app.models import reply_gen, summarizer
+from app.utils import decoding
+
+SAMPLE_TEXT = (
+    "I have been a loyal customer for 5 years and recently faced a terrible experience. "
+    "My order #12345 was delayed by 2 weeks without any notification. When I called customer "
+    "service, I was put on hold for 45 minutes and then disconnected. I tried again the next "
+    "day and was told my order was lost. This is completely unacceptable and I demand a full "
+    "refund plus compensation for my time wasted."
+)
+LENGTHS = (32, 96)
+REPEAT = 3
+
+
+def _time_summarizer(strategy, tokens):
+    pipe = summarizer.summarizer.get()
+    start = time.perf_counter()
+    pipe(SAMPLE_TEXT, max_length=tokens, min_length=tokens, truncation=True, **strategy["generate"])
+    return (time.perf_counter() - start) * 1000
+
+
+def _time_reply(strategy, tokens):
+    pipe = reply_gen.local_generator.get()
+    prompt = f"Write a polite customer support response to this ticket:\nTicket: {SAMPLE_TEXT}\nResponse:"
+    start = time.perf_counter()
+    pipe(prompt, max_new_tokens=tokens, min_new_tokens=tokens, **strategy["generate"])
+    return (time.perf_counter() - start) * 1000
+
+
+TIMERS = {"summarizer": _time_summarizer, "reply_local": _time_reply}
+
+
+def calibrate(model):
+    entries = {}
+    timer = TIMERS[model]
+    timer(decoding.STRATEGIES[model][-1], LENGTHS[0])  # Warm up
+    for strategy in decoding.STRATEGIES[model]:
+        short, long = (min(timer(strategy, n) for _ in range(REPEAT)) for n in LENGTHS)
+        per_token = max((long - short) / (LENGTHS[1] - LENGTHS[0]), 0.1)
+        fixed = max(short - per_token * LENGTHS[0], 0.0)
+        entries[strategy["name"]] = {"fixed_ms": round(fixed, 1), "per_token_ms": round(per_token, 2)}
+        print(f"{model:<12} {strategy['name']:<8} fixed {fixed:7.1f} ms  per token {per_token:6.2f} ms")
+    return entries
+
+
+def main():
+    models = sys.argv[1:] or list(TIMERS)
+    profile = {}
+    if os.path.isfile(decoding.DECODING_PROFILE_PATH):
+        with open(decoding.DECODING_PROFILE_PATH, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    for model in models:
+        profile[model] = calibrate(model)
+
+    directory = os.path.dirname(decoding.DECODING_PROFILE_PATH)
+    if directory:  # A bare filename goes to the working directory
+        os.makedirs(directory, exist_ok=True)
+    with open(decoding.DECODING_PROFILE_PATH, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Wrote {decoding.DECODING_PROFILE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Replay captured production traffic against a running ai-service.
+
+Reads a capture log written with TRAFFIC_CAPTURE_PATH set (gzip JSON lines,
+see app/utils/traffic_capture.py) and re-issues each request with its original
+body and priority/deadline headers. Requests are sent at their recorded
+inter-arrival times divided by --speed, or as fast as --concurrency allows
+with --speed max. Idle gaps longer than --max-gap seconds (e.g. between
+capture sessions) are shortened to --max-gap. Reports per-endpoint latency
+percentiles and errors next to the latency recorded at capture time.
+Run from the ai-service directory:
+
+    python -m scripts.replay_traffic capture.jsonl.gz --url http://localhost:8001
+    python -m scripts.replay_traffic capture.jsonl.gz --speed 4 --endpoints /classify,/reply
+    python -m scripts.replay_traffic capture.jsonl.gz --speed max --concurrency 64 --json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def load_capture(path: str, endpoints: Optional[List[str]] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Read capture records in arrival order, tolerating a partially written tail"""
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Truncated final line
+                if endpoints is None or record["p"] in endpoints:
+                    records.append(record)
+        except (EOFError, zlib.error):
+            pass  # Capture still running or process killed: use what was flushed
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+
+def schedule(records: List[Dict], speed: Optional[float], max_gap: float) -> List[float]:
+    """Send offsets (s) for each record: recorded gaps / speed, capped at max_gap"""
+    offsets, offset = [], 0.0
+    for previous, record in zip([None] + records[:-1], records):
+        if previous is not None and speed is not None:
+            offset += min(record["t"] - previous["t"], max_gap) / speed
+        offsets.append(offset)
+    return offsets
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+async def replay(records: List[Dict], url: str, speed: Optional[float], concurrency: int,
+                 max_gap: float, timeout: float) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = defaultdict(lambda: {"latency_ms": [], "lag_ms": [], "status": Counter()})
+    offsets = schedule(records, speed, max_gap)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.monotonic()
+
+        async def send(record: Dict, offset: float):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with semaphore:
+                sent = time.monotonic()
+                stats = results[record["p"]]
+                stats["lag_ms"].append((sent - start - offset) * 1000)
+                try:
+                    response = await client.post(record["p"], json=record["b"], headers=record.get("h") or {})
+                    stats["status"][str(response.status_code)] += 1
+                    if response.status_code < 400:
+                        stats["latency_ms"].append((time.monotonic() - sent) * 1000)
+                except httpx.HTTPError as e:
+                    stats["status"][type(e).__name__] += 1
+
+        await asyncio.gather(*(send(r, o) for r, o in zip(records, offsets)))
+        elapsed = time.monotonic() - start
+
+    recorded = defaultdict(list)
+    for record in records:
+        if record.get("s") is not None and record["s"] < 400:
+            recorded[record["p"]].append(record["ms"])
+
+    report = {}
+    for path, stats in sorted(results.items()):
+        total = sum(stats["status"].values())
+        report[path] = {
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+            "errors": {code: n for code, n in stats["status"].items() if not code.isdigit() or int(code) >= 400},
+            "p50_ms": percentile(stats["latency_ms"], 0.5),
+            "p90_ms": percentile(stats["latency_ms"], 0.9),
+            "p99_ms": percentile(stats["latency_ms"], 0.99),
+            "max_ms": round(max(stats["latency_ms"]), 1) if stats["latency_ms"] else None,
+            "recorded_p50_ms": percentile(recorded[path], 0.5),
+            "recorded_p99_ms": percentile(recorded[path], 0.99),
+            # How late requests were sent: high values mean the client, not the
+            # service, was the bottleneck (raise --concurrency)
+            "send_lag_p99_ms": percentile(stats["lag_ms"], 0.99),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Capture log (TRAFFIC_CAPTURE_PATH)")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--speed", default="1", help="Time scale: 1 = real time, 4 = 4x faster, max = no delays")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max requests in flight")
+    parser.add_argument("--endpoints", help="Comma list of paths to replay (default: all captured)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="Cap on recorded idle gaps (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+    endpoints = [p.strip() for p in args.endpoints.split(",")] if args.endpoints else None
+    records = load_capture(args.capture, endpoints, args.limit)
+    if not records:
+        sys.exit(f"No requests to replay in {args.capture}")
+
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"Replaying {len(records)} requests (captured over {span:.0f}s) at "
+          f"{'max speed' if speed is None else f'{speed:g}x'} against {args.url}", file=sys.stderr)
+    report = asyncio.run(replay(records, args.url, speed, args.concurrency, args.max_gap, args.timeout))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'endpoint':<12}{'reqs':>7}{'rps':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+          f"{'rec p50':>9}{'rec p99':>9}  errors")
+    for path, row in report.items():
+        cells = [row[k] for k in ("p50_ms", "p90_ms", "p99_ms", "max_ms", "recorded_p50_ms", "recorded_p99_ms")]
+        print(f"{path:<12}{row['requests']:>7}{row['throughput_rps']:>8}"
+              + "".join(f"{'-' if c is None else c:>9}" for c in cells)
+              + f"  {row['errors'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Snapshot every model into the local safetensors cache for fast, offline starts.
+
+Downloads each model from the hub once and writes it to MODEL_CACHE_DIR/<name>
+with safetensors weights, which the service then memory-maps on load without
+any hub lookups. Run from the ai-service directory (the Dockerfile runs this
+at build time):
+
+    python -m scripts.snapshot_models            # all models
+    python -m scripts.snapshot_models sentiment  # selected models
+"""
+import sys
+import time
+
+from app.utils import model_cache
+
+
+def snapshot(name: str) -> None:
+    spec = model_cache.MODEL_SPECS[name]
+    path = model_cache.snapshot_path(name)
+    start = time.monotonic()
+
+    if spec["task"] == "sentence-embedding":
+        from sentence_transformers import SentenceTransformer
+
+        SentenceTransformer(spec["model_id"]).save(path, safe_serialization=True)
+    else:
+        from transformers import pipeline
+
+        pipe = pipeline(spec["task"], model=spec["model_id"])
+        pipe.model.save_pretrained(path, safe_serialization=True)
+        pipe.tokenizer.save_pretrained(path)
+
+    print(f"{name:<12} {spec['model_id']:<60} {time.monotonic() - start:6.1f}s -> {path}")
+
+
+def main():
+    names = sys.argv[1:] or list(model_cache.MODEL_SPECS)
+    unknown = [n for n in names if n not in model_cache.MODEL_SPECS]
+    if unknown:
+        sys.exit(f"Unknown model(s): {', '.join(unknown)}. Choose from {', '.join(model_cache.MODEL_SPECS)}")
+    for name in names:
+        snapshot(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure cold-start time of the ai-service.
+
+Reports how long `import app.main` takes in a fresh interpreter, then starts
+uvicorn and reports time until `/` answers and until `/ready` returns 200,
+followed by the service's own `/startup` report (per-model load times and
+whether each came from a local snapshot). Run from the ai-service directory:
+
+    python -m scripts.startup_report
+    PRELOAD_MODELS=all python -m scripts.startup_report
+"""
+import json
+import subprocess
+import sys
+import time
+
+import requests
+
+PORT = 8011
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def _wait_for(path: str, start: float, timeout: float) -> float:
+    while time.monotonic() - start < timeout:
+        try:
+            if requests.get(BASE_URL + path, timeout=1).status_code == 200:
+                return time.monotonic() - start
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{path} not ready after {timeout}s")
+
+
+def main():
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True)
+    print(f"import app.main:      {time.monotonic() - start:6.2f}s")
+
+    start = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"]
+    )
+    try:
+        print(f"first answer on /:    {_wait_for('/', start, 600):6.2f}s")
+        print(f"ready (/ready = 200): {_wait_for('/ready', start, 600):6.2f}s")
+        print(json.dumps(requests.get(BASE_URL + "/startup", timeout=5).json(), indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
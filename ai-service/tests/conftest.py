@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make `app` importable however pytest is invoked (repo root or ai-service/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+import random
+
+from app.utils import concurrency
+from app.utils.concurrency import AdaptiveLimiter
+
+
+def _run(limiter, latencies, inflight=1):
+    """Feed latencies keeping `inflight` requests admitted (as far as the limit allows)"""
+    held = 0
+    for latency in latencies:
+        while held < inflight and limiter.try_acquire():
+            held += 1
+        limiter.release(latency)
+        held -= 1
+    for _ in range(held):
+        limiter.release(latencies[-1])
+
+
+def test_sequential_latency_spread_does_not_back_off():
+    rng = random.Random(0)
+    limiter = AdaptiveLimiter("reply")
+    _run(limiter, [rng.uniform(0.5, 3.0) for _ in range(500)])
+    assert limiter.stats["backoffs"] == 0
+    assert limiter.limit >= concurrency.INITIAL_LIMIT
+
+
+def test_concurrent_latency_spread_does_not_collapse():
+    rng = random.Random(1)
+    limiter = AdaptiveLimiter("reply")
+    _run(limiter, [rng.uniform(0.5, 3.0) for _ in range(500)], inflight=6)
+    assert limiter.limit >= concurrency.INITIAL_LIMIT
+
+
+def test_summarize_mix_on_separate_limiters_does_not_back_off():
+    rng = random.Random(2)
+    extractive = AdaptiveLimiter("summarize:extractive")
+    abstractive = AdaptiveLimiter("summarize:abstractive")
+    for _ in range(300):
+        if rng.random() < 0.7:
+            _run(extractive, [rng.uniform(0.02, 0.08)])
+        else:
+            _run(abstractive, [rng.uniform(1.5, 4.0)])
+    assert extractive.stats["backoffs"] == 0
+    assert abstractive.stats["backoffs"] == 0
+
+
+def test_single_slow_request_does_not_back_off():
+    limiter = AdaptiveLimiter("classify")
+    latencies = [0.1] * 100
+    latencies[50] = 5.0
+    _run(limiter, latencies, inflight=int(limiter.limit))
+    assert limiter.stats["backoffs"] == 0
+
+
+def test_latency_rising_with_inflight_backs_off():
+    limiter = AdaptiveLimiter("reply")
+    _run(limiter, [0.5] * 3 * concurrency.SAMPLE_WINDOW, inflight=int(limiter.limit))
+    before = limiter.limit
+    # Queueing: every request now waits behind the others
+    _run(limiter, [0.5 * 4] * 3 * concurrency.SAMPLE_WINDOW, inflight=int(limiter.limit))
+    assert limiter.stats["backoffs"] >= 1
+    assert limiter.limit < before
+
+
+def test_deadline_misses_cut_once_per_window():
+    limiter = AdaptiveLimiter("sentiment")
+    for _ in range(5):
+        assert limiter.try_acquire()
+    for _ in range(5):
+        limiter.release(0.1, overloaded=True)
+    assert limiter.stats["backoffs"] == 1
+    assert limiter.limit == concurrency.INITIAL_LIMIT * concurrency.BACKOFF_RATIO
+
+
+def test_shed_over_limit():
+    limiter = AdaptiveLimiter("embed")
+    admitted = [limiter.try_acquire() for _ in range(int(limiter.limit) + 2)]
+    assert admitted.count(True) == int(concurrency.INITIAL_LIMIT)
+    assert limiter.stats["shed"] == 2
+
+
+def test_degrade_mode_uses_endpoint_of_class_limiter():
+    assert concurrency.degrade_mode("summarize:abstractive") == concurrency.DEGRADE_MODES["summarize"]
+    assert concurrency.degrade_mode("unknown") == "reject"
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from app.utils import jobs
+from app.utils.jobs import JobStore
+from app.utils.request_context import RequestCancelled
+
+
+async def _echo(payload, ctx):
+    for _ in range(int(payload.get("steps", 1))):
+        await asyncio.sleep(0.01)
+        if ctx.cancelled:
+            raise RequestCancelled("Cancelled")
+    return {"echo": payload["text"]}
+
+
+@pytest.fixture(autouse=True)
+def echo_runner():
+    jobs.register_runner("echo", _echo)
+
+
+async def _settle(store):
+    while store._tasks:
+        await asyncio.sleep(0.01)
+
+
+def test_identical_pending_submissions_share_work():
+    async def scenario():
+        store = JobStore()
+        first, first_handle, dedup1 = store.submit("echo", {"text": "a", "steps": 5})
+        second, second_handle, dedup2 = store.submit("echo", {"text": "a", "steps": 5})
+        other, _, dedup3 = store.submit("echo", {"text": "b"})
+        assert (dedup1, dedup2, dedup3) == (False, True, False)
+        assert first is second and other is not first
+        assert first_handle == first["id"] and second_handle != first_handle
+        await _settle(store)
+        for handle in (first_handle, second_handle):
+            view = jobs.public_view(store.get(handle), handle)
+            assert view["job_id"] == handle
+            assert view["status"] == "succeeded" and view["result"] == {"echo": "a"}
+        # Finished jobs are not joined
+        _, _, dedup4 = store.submit("echo", {"text": "a", "steps": 5})
+        assert dedup4 is False
+        await _settle(store)
+
+    asyncio.run(scenario())
+
+
+def test_cancel_detaches_one_submitter_until_the_last():
+    async def scenario():
+        store = JobStore()
+        job, first, _ = store.submit("echo", {"text": "a", "steps": 20})
+        _, second, _ = store.submit("echo", {"text": "a", "steps": 20})
+        await asyncio.sleep(0.03)
+
+        store.cancel(first)
+        assert job["status"] == "running"
+        assert jobs.public_view(job, first)["status"] == "cancelled"
+        # Repeated cancels from the same handle do not count twice
+        store.cancel(first)
+        assert job["status"] == "running"
+
+        store.cancel(second)
+        assert job["status"] == "cancelled"
+        await _settle(store)
+        assert jobs.public_view(store.get(second), second)["status"] == "cancelled"
+        assert store.cancel("unknown") is None
+
+    asyncio.run(scenario())
+
+
+def test_detached_submitter_sees_cancelled_after_success():
+    async def scenario():
+        store = JobStore()
+        job, first, _ = store.submit("echo", {"text": "a", "steps": 3})
+        _, second, _ = store.submit("echo", {"text": "a", "steps": 3})
+        store.cancel(first)
+        await _settle(store)
+        assert jobs.public_view(job, first)["status"] == "cancelled"
+        assert jobs.public_view(job, first)["result"] is None
+        assert jobs.public_view(job, second)["status"] == "succeeded"
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_expire_after_retention(monkeypatch):
+    async def scenario():
+        store = JobStore()
+        _, first, _ = store.submit("echo", {"text": "a"})
+        _, second, _ = store.submit("echo", {"text": "a"})
+        await _settle(store)
+        assert store.get(first) is not None
+
+        monkeypatch.setattr(jobs, "RETENTION_SECONDS", -1)
+        assert store.get(second) is None
+        assert store.get(first) is None
+        assert store.stats()["jobs"] == {}
+
+    asyncio.run(scenario())
+
+
+def test_max_finished_drops_oldest(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_FINISHED", 2)
+
+    async def scenario():
+        store = JobStore()
+        handles = []
+        for text in "abc":
+            _, handle, _ = store.submit("echo", {"text": text})
+            handles.append(handle)
+            await _settle(store)
+        store.stats()
+        assert store.get(handles[0]) is None
+        assert store.get(handles[2]) is not None
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_store_keeps_handles(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        store = JobStore(path)
+        _, first, _ = store.submit("echo", {"text": "a"})
+        _, second, _ = store.submit("echo", {"text": "a"})
+        await _settle(store)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    reopened = JobStore(path)
+    assert reopened.get(first) is reopened.get(second)
+    assert jobs.public_view(reopened.get(second), second)["result"] == {"echo": "a"}
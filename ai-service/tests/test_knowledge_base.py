@@ -0,0 +1,99 @@
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+from app.models import knowledge_base
+from app.models.knowledge_base import EMBEDDING_DIM, KnowledgeBaseIndex
+from app.utils.text_processing import tokenize_text
+
+
+def fake_embeddings(texts):
+    """Bag-of-words hashed into EMBEDDING_DIM, unit-normalized"""
+    matrix = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for token in tokenize_text(text):
+            matrix[i, zlib.crc32(token.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+        norm = np.linalg.norm(matrix[i])
+        if norm:
+            matrix[i] /= norm
+    return matrix
+
+
+@pytest.fixture(autouse=True)
+def fake_embedder(monkeypatch):
+    monkeypatch.setattr(knowledge_base.embedder, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(knowledge_base, "SAVE_DELAY_SECONDS", 0.05)
+
+
+ARTICLES = [
+    {"id": "outage", "title": "Outage", "text": "For internet outages check the router lights"},
+    {"id": "refund", "title": "Refunds", "text": "Refunds are paid within five business days"},
+    {"id": "login", "title": "Login", "text": "Reset your password from the login page"},
+]
+
+
+def test_search_update_and_delete(tmp_path):
+    index = KnowledgeBaseIndex(str(tmp_path))
+    assert index.upsert(ARTICLES) == ["outage", "refund", "login"]
+    assert index.search("router lights are red")[0]["id"] == "outage"
+
+    index.upsert([{"id": "refund", "title": "Refunds", "text": "Chargebacks are handled by billing"}])
+    assert index.search("chargebacks billing")[0]["id"] == "refund"
+    assert index.search("business days", top_k=3)[0]["id"] != "refund"
+
+    assert index.delete("login")
+    assert not index.delete("login")
+    assert len(index) == 2
+    assert "login" not in [r["id"] for r in index.search("password login page")]
+
+
+def test_saves_are_debounced_and_reload_memory_mapped(tmp_path):
+    index = KnowledgeBaseIndex(str(tmp_path))
+    for article in ARTICLES:
+        index.upsert([article])
+    assert not (tmp_path / "articles.json").exists()
+    time.sleep(0.3)
+    assert (tmp_path / "articles.json").exists()
+
+    reloaded = KnowledgeBaseIndex(str(tmp_path))
+    assert isinstance(reloaded._matrix, np.memmap)
+    assert len(reloaded) == 3
+    assert reloaded.search("router lights")[0]["id"] == "outage"
+
+    # The read-only mapping is copied on the first write
+    reloaded.upsert([{"id": "billing", "title": "Billing", "text": "Invoices are emailed monthly"}])
+    assert reloaded.search("invoices emailed")[0]["id"] == "billing"
+
+
+def test_compaction_drops_freed_rows(tmp_path):
+    index = KnowledgeBaseIndex(str(tmp_path))
+    index.upsert([{"id": f"a{i}", "title": "", "text": f"article {i} about topic{i}"} for i in range(200)])
+    for i in range(190):
+        index.delete(f"a{i}")
+    assert index.info()["rows"] == 200
+
+    index.save()
+    assert index.info()["rows"] == 10
+    assert index.search("topic195")[0]["id"] == "a195"
+    assert index._save_timer is None
+
+    reloaded = KnowledgeBaseIndex(str(tmp_path))
+    assert sorted(reloaded._articles) == sorted(f"a{i}" for i in range(190, 200))
+    assert reloaded.search("topic195")[0]["id"] == "a195"
+
+
+def test_pool_entry_points(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge_base, "KB_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(knowledge_base, "_index", None)
+    assert not knowledge_base.known_empty()  # Not loaded yet
+    assert knowledge_base.retrieve_snippets("router") == []
+    assert knowledge_base.known_empty()
+    assert knowledge_base.upsert_articles(ARTICLES) == (["outage", "refund", "login"], 3)
+    assert knowledge_base.delete_article("nope") is None
+    assert knowledge_base.delete_article("login") == 2
+    results, total = knowledge_base.search("router lights", 1)
+    assert [r["id"] for r in results] == ["outage"] and total == 2
+    knowledge_base.flush()
+    assert (tmp_path / "articles.json").exists()
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from app.api import routes
+from app.api.routes import ClassifyRequest, SentimentRequest, SummarizeRequest
+from app.models import classifier, sentiment
+from app.utils import near_duplicates
+from app.utils.near_duplicates import NearDuplicateIndex
+from app.utils.request_context import DeadlineExceeded, RequestCancelled, RequestContext
+
+COMPLAINT = (
+    "Hello, my name is {name}. I was charged twice for my broadband bill this month and "
+    "nobody has answered my emails for two weeks. My account number is {account}. Please "
+    "refund the duplicate payment, reply to my emails and stop sending me late payment "
+    "letters for a bill that I already paid on time through the app last month. I have "
+    "been a loyal customer for years and this is the third time this has happened to me."
+)
+FIRST = COMPLAINT.format(name="Alice", account="44120098")
+SECOND = COMPLAINT.format(name="Bob", account="99310457")
+UNRELATED = "The courier left my parcel in the rain and the box was soaked through when I got home"
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(near_duplicates, "ENABLED", True)
+    monkeypatch.setattr(near_duplicates, "_index", None)
+
+
+def test_similar_texts_share_a_cluster():
+    index = NearDuplicateIndex()
+    first = index.match(FIRST)
+    second = index.match(SECOND)
+    assert not first.duplicate
+    assert second.duplicate and second.cluster is first.cluster
+    assert second.similarity >= index.threshold
+    assert not index.match(UNRELATED).duplicate
+    assert index.match("charged twice") is None  # Too short to tell
+    assert index.snapshot()["clusters"] == 2
+
+
+def test_cluster_count_stays_within_max():
+    index = NearDuplicateIndex(max_clusters=3)
+    for i in range(10):
+        index.match(f"complaint number {i} about topic{i} with extra words {i * 7} here")
+        assert index.snapshot()["clusters"] <= 3
+    assert index.snapshot()["clusters_expired"] == 7
+
+
+def test_result_keys_per_cluster_are_capped():
+    async def scenario():
+        match = NearDuplicateIndex().match(FIRST)
+        for i in range(near_duplicates.MAX_RESULT_KEYS + 3):
+            async def compute():
+                return {"label": str(i)}
+            await match.run(("k", i), compute, ("label",))
+        return match.cluster.results
+
+    results = asyncio.run(scenario())
+    assert len(results) == near_duplicates.MAX_RESULT_KEYS
+    assert ("k", 0) not in results
+
+
+def test_waiter_stops_at_its_own_deadline_and_cancel():
+    async def scenario():
+        index = NearDuplicateIndex()
+        leader = index.match(FIRST)
+        waiter = index.match(SECOND)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"label": "NEGATIVE"}
+
+        async def never():
+            raise AssertionError("waiters must not compute while the leader runs")
+
+        task = asyncio.ensure_future(leader.run("k", slow, ("label",)))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await waiter.run("k", never, ("label",), RequestContext(timeout_ms=50))
+        ctx = RequestContext()
+        ctx.cancel()
+        with pytest.raises(RequestCancelled):
+            await waiter.run("k", never, ("label",), ctx)
+        release.set()
+        assert await task == ({"label": "NEGATIVE"}, False)
+        assert await waiter.run("k", never, ("label",)) == ({"label": "NEGATIVE"}, True)
+
+    asyncio.run(scenario())
+
+
+def test_summaries_are_never_reused(monkeypatch):
+    """A near-duplicate complaint must not get another customer's summary"""
+    calls = []
+
+    async def fake_summarize(request, ctx, mode=None):
+        calls.append(request.text)
+        quoted = request.text.split(". ")[2]  # "My account number is ..."
+        return {"summary": quoted, "input_length": len(request.text), "summary_length": len(quoted)}
+
+    monkeypatch.setattr(routes, "_run_summarize", fake_summarize)
+
+    async def scenario():
+        first = await routes.summarize_text(SummarizeRequest(text=FIRST), RequestContext())
+        second = await routes.summarize_text(SummarizeRequest(text=SECOND), RequestContext())
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    index = NearDuplicateIndex()
+    index.match(FIRST)
+    assert index.match(SECOND).duplicate  # The texts do cluster together
+    assert len(calls) == 2
+    assert "44120098" in first["summary"]
+    assert "99310457" in second["summary"] and "44120098" not in second["summary"]
+    assert second["input_length"] == len(SECOND)
+
+
+def test_labels_are_reused_but_long_sentiment_is_not(monkeypatch):
+    classify_calls, sentiment_calls = [], []
+
+    def fake_classify(text, labels=None):
+        classify_calls.append(text)
+        return {"top_label": "billing", "top_score": 0.9, "full_output": {"labels": ["billing"], "scores": [0.9]}}
+
+    def fake_sentiment(text, mode="single"):
+        sentiment_calls.append(text)
+        if mode == "long":
+            return {"label": "NEGATIVE", "score": 0.9, "segments": [{"start": 0, "end": len(text)}]}
+        return {"label": "NEGATIVE", "score": 0.9}
+
+    monkeypatch.setattr(classifier, "classify_text", fake_classify)
+    monkeypatch.setattr(sentiment, "analyze_sentiment", fake_sentiment)
+
+    async def scenario():
+        responses = []
+        for text in (FIRST, SECOND):
+            responses.append(await routes.classify_text(ClassifyRequest(text=text), RequestContext()))
+        for mode in ("single", "long"):
+            for text in (FIRST, SECOND):
+                request = SentimentRequest(text=text, mode=mode)
+                responses.append(await routes.analyze_sentiment(request, RequestContext()))
+        return responses
+
+    _, classified, _, single, long_first, long_second = asyncio.run(scenario())
+    assert classify_calls == [FIRST]
+    assert classified["near_duplicate"]["reused"] and classified["top_label"] == "billing"
+    assert single["near_duplicate"]["reused"] and single["label"] == "NEGATIVE"
+    assert sentiment_calls == [FIRST, FIRST, SECOND]
+    assert not long_second["near_duplicate"]["reused"]
+    assert long_second["segments"][0]["end"] == len(SECOND)
+    assert long_first["segments"][0]["end"] == len(FIRST)
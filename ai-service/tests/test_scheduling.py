@@ -0,0 +1,70 @@
+from collections import Counter
+
+from app.utils import scheduling
+from app.utils.scheduling import FairQueue
+
+WEIGHTS = {"interactive": 16.0, "standard": 4.0, "bulk": 1.0}
+
+
+def test_backlogged_classes_share_by_weight():
+    queue = FairQueue(WEIGHTS)
+    for name in WEIGHTS:
+        for i in range(42):
+            queue.append(i, name)
+    served = Counter(queue.popleft()[0] for _ in range(21))
+    assert served == {"interactive": 16, "standard": 4, "bulk": 1}
+
+
+def test_fifo_within_a_class():
+    queue = FairQueue(WEIGHTS)
+    for i in range(5):
+        queue.append(i, "standard")
+    assert [queue.popleft()[1] for _ in range(5)] == [0, 1, 2, 3, 4]
+
+
+def test_idle_class_does_not_bank_credit():
+    queue = FairQueue(WEIGHTS)
+    for i in range(100):
+        queue.append(i, "bulk")
+    for _ in range(50):
+        queue.popleft()
+    # Interactive arriving behind a bulk backlog is served next, but only
+    # for its own share: it did not accumulate credit while idle
+    for i in range(40):
+        queue.append(i, "interactive")
+    served = [queue.popleft()[0] for _ in range(17)]
+    assert served[0] == "interactive"
+    assert Counter(served) == {"interactive": 16, "bulk": 1}
+
+
+def test_unknown_priority_uses_default_class(monkeypatch):
+    monkeypatch.setattr(scheduling, "DEFAULT_PRIORITY", "standard")
+    queue = FairQueue(WEIGHTS)
+    queue.append("x", "vip")
+    assert queue.depth("standard") == 1
+    assert queue.popleft() == ("standard", "x")
+
+
+def test_ahead_of():
+    queue = FairQueue(WEIGHTS)
+    assert queue.ahead_of("interactive") == 0
+    for i in range(10):
+        queue.append(i, "bulk")
+    assert queue.ahead_of("bulk") == 10
+    # One interactive round lets 1/16 of a bulk item through
+    assert queue.ahead_of("interactive") == 1 / 16
+    for i in range(32):
+        queue.append(i, "interactive")
+    # A bulk arrival waits for its own queue plus up to 16 interactive per round
+    assert queue.ahead_of("bulk") == 10 + 32
+
+
+def test_resolve_priority_header_only_demotes(monkeypatch):
+    monkeypatch.setattr(scheduling, "PRIORITY_WEIGHTS", WEIGHTS)
+    monkeypatch.setattr(scheduling, "DEFAULT_PRIORITY", "standard")
+    monkeypatch.setattr(scheduling, "PRIORITY_API_KEYS", {"chat-key": "interactive", "batch-key": "bulk"})
+    assert scheduling.resolve_priority("bulk") == "bulk"
+    assert scheduling.resolve_priority("interactive") == "standard"
+    assert scheduling.resolve_priority("nonsense") == "standard"
+    assert scheduling.resolve_priority(None, "chat-key") == "interactive"
+    assert scheduling.resolve_priority("interactive", "batch-key") == "bulk"
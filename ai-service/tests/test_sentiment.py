@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from app.models import sentiment
+
+
+class FakeTokenizer:
+    """Whitespace tokens with character offsets"""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"offset_mapping": [[m.span() for m in re.finditer(r"\S+", t)] for t in texts]}
+
+
+class FakePipeline:
+    """NEGATIVE for any window mentioning anger, POSITIVE otherwise"""
+
+    tokenizer = FakeTokenizer()
+
+    def __call__(self, texts, **kwargs):
+        texts = [texts] if isinstance(texts, str) else texts
+        return [
+            {"label": "NEGATIVE", "score": 0.99} if "furious" in t else {"label": "POSITIVE", "score": 0.98}
+            for t in texts
+        ]
+
+
+class FakeModel:
+    def get(self):
+        return FakePipeline()
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    monkeypatch.setattr(sentiment, "sentiment_analyzer", FakeModel())
+
+
+CALM = "Thanks for the update on my order today. "
+
+
+def test_calm_then_furious_is_negative():
+    result = sentiment.analyze_sentiment(CALM * 200 + "I am furious now.", mode="auto")
+    assert result["mode"] == "long"
+    # The mean is still dominated by the calm opening...
+    assert result["positive_probability"] > 0.5
+    # ...but the headline follows the furious ending
+    assert result["final"]["label"] == "NEGATIVE"
+    assert result["trend"] <= -sentiment.NEGATIVE_SHIFT
+    assert result["label"] == "NEGATIVE"
+    assert result["label_source"] == "final"
+    assert result["score"] == 0.99
+
+
+def test_furious_then_calm_follows_the_mean():
+    result = sentiment.analyze_sentiment("I am furious now. " + CALM * 200, mode="long")
+    assert result["label"] == "POSITIVE"
+    assert result["label_source"] == "mean"
+
+
+def test_short_text_stays_single_pass():
+    result = sentiment.analyze_sentiment("I am furious now.", mode="auto")
+    assert result == {"label": "NEGATIVE", "score": 0.99}
+
+
+def test_segment_count_is_bounded():
+    result = sentiment.analyze_sentiment(CALM * 2000, mode="long")
+    assert result["segment_count"] <= sentiment.MAX_SEGMENTS + 1
+    assert all(seg["tokens"] <= sentiment.MAX_MODEL_TOKENS for seg in result["segments"])